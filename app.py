@@ -1,10 +1,47 @@
 import os
 import re
-from flask import Flask, request, jsonify, render_template, send_from_directory
+import sys
+import gzip
+import json
+import mmap
+import struct
+import pickle
+import argparse
+import inspect
+import io
+import cProfile
+import pstats
+from time import perf_counter
+import hashlib
+import tempfile
+import threading
+import uuid
+import signal
+import time
+import multiprocessing
+from array import array
+from collections import Counter, OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from queue import SimpleQueue
+from flask import Flask, Response, g, request, jsonify, render_template, send_from_directory, stream_with_context
 from flask_cors import CORS 
 import os
 import re
 
+try:
+    import brotli
+except ImportError:     # Brotli es opcional: sin él las respuestas se comprimen con gzip
+    brotli = None
+
+try:
+    import resource
+except ImportError:     # Sin resource (Windows) las construcciones no tienen límites
+    resource = None
+
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 app = Flask(__name__,
@@ -14,6 +51,86 @@ CORS(app)
 
 # --- Implementación del Parser LR(1) ---
 
+# Modos de construcción soportados por LR1Parser
+PARSER_MODES = {
+    'lr1': 'LR(1)',      # LR(1) canónico
+    'lalr1': 'LALR(1)',  # núcleos LR(0) con lookaheads propagados
+    'slr1': 'SLR(1)',    # núcleos LR(0) con reducciones sobre FOLLOW
+}
+
+# Formato binario de las tablas exportadas (ver CompiledTables.export)
+ARTIFACT_MAGIC = b'LR1T'
+ARTIFACT_VERSION = 3
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', os.path.join(BASE_DIR, 'artifacts'))
+
+# Presupuesto por defecto de un análisis (pasos y segundos)
+PARSE_MAX_STEPS = int(os.environ.get('PARSE_MAX_STEPS', 1_000_000))
+PARSE_TIME_LIMIT = float(os.environ.get('PARSE_TIME_LIMIT', 10.0))
+
+# Niveles de traza de parse(): solo reconocer, solo árbol o traza completa
+TRACE_LEVELS = ('none', 'tree', 'full')
+
+# Campos que se pueden pedir a /parse con "fields" (los de GLR, incremental y
+# compare_modes solo aparecen si se pidió ese análisis)
+PARSE_FIELDS = (
+    'accepted', 'mode', 'trace', 'grammar_id', 'state_count', 'augmented_grammar', 'first_sets',
+    'first_table', 'canonical_collection', 'parsing_table_action', 'parsing_table_goto',
+    'parsing_steps', 'parse_tree', 'lr1_dot', 'grammar_analysis', 'size_estimate',
+    'table_compression', 'normalization', 'parse_forest', 'ambiguities', 'input_id', 'reparse',
+    'mode_comparison',
+)
+
+# Normalización de la gramática antes de construir (ver normalize_grammar):
+# ninguna, quitar símbolos inútiles y duplicados, o además cadenas unitarias
+NORMALIZE_LEVELS = ('none', 'clean', 'units')
+
+# Respuestas JSON a partir de este tamaño se comprimen (gzip o Brotli)
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+# Estados por página en los endpoints /grammars/<id>/...
+STATES_PAGE_SIZE = 100
+STATES_PAGE_MAX = 1000
+
+# Lotes a partir de este tamaño se reparten en un pool de procesos
+BATCH_PROCESS_THRESHOLD = int(os.environ.get('BATCH_PROCESS_THRESHOLD', 2000))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+
+# Construcciones en segundo plano: procesos simultáneos y límites por trabajo
+BUILD_WORKERS = int(os.environ.get('BUILD_WORKERS', 2))
+BUILD_CPU_LIMIT = int(os.environ.get('BUILD_CPU_LIMIT', 300))              # segundos de CPU
+BUILD_MEMORY_LIMIT = int(os.environ.get('BUILD_MEMORY_LIMIT', 2048)) * 1024 * 1024   # MB
+BUILD_JOBS_KEPT = int(os.environ.get('BUILD_JOBS_KEPT', 1000))
+# Trabajos en cola o en curso admitidos (más allá, /jobs responde 429), segundos
+# que se recuerda un trabajo terminado y duración máxima de /jobs/<id>/events
+BUILD_QUEUE_LIMIT = int(os.environ.get('BUILD_QUEUE_LIMIT', 64))
+BUILD_JOBS_TTL = int(os.environ.get('BUILD_JOBS_TTL', 3600))
+BUILD_EVENTS_TIMEOUT = int(os.environ.get('BUILD_EVENTS_TIMEOUT', 600))
+
+# Compactar las tablas de cada parser construido (ver CompiledTables.compress)
+TABLE_COMPRESSION = os.environ.get('TABLE_COMPRESSION', '1') not in ('', '0')
+# Comprobar cada compactación contra las tablas densas (CompiledTables.covers)
+COMPRESSION_VERIFY = os.environ.get('COMPRESSION_VERIFY', '') not in ('', '0')
+
+# Comprobar cada reconstrucción incremental contra una construcción completa
+INCREMENTAL_VERIFY = os.environ.get('INCREMENTAL_VERIFY', '') not in ('', '0')
+
+# Límites de las construcciones que hace el servidor (0 = sin límite): estados,
+# ítems de las clausuras y segundos. Las construcciones en segundo plano (/jobs)
+# y la línea de comandos solo tienen los límites de CPU y memoria.
+BuildLimits = namedtuple('BuildLimits', ['max_states', 'max_items', 'time_limit'])
+BUILD_LIMITS = BuildLimits(
+    max_states=int(os.environ.get('BUILD_MAX_STATES', 20_000)),
+    max_items=int(os.environ.get('BUILD_MAX_ITEMS', 2_000_000)),
+    time_limit=float(os.environ.get('BUILD_TIME_LIMIT', 10.0)))
+
+# Cubetas (segundos) de los histogramas de /metrics
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Perfilado con cProfile de una petición con la cabecera X-Profile (desactivado por defecto)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') not in ('', '0')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'lr1-profiles'))
+PROFILES_KEPT = int(os.environ.get('PROFILES_KEPT', 100))
+
 class Grammar:
     def __init__(self):
         self.productions = []           # lista de (lhs, rhs_list)
@@ -21,6 +138,8 @@ class Grammar:
         self.terminals = set()
         self.non_terminals = set()
         self._rhs_symbols = set()       # todos los símbolos que aparecen en RHS
+        self.unit_chains = {}           # (lhs, rhs) -> no terminales intermedios (normalize_grammar)
+        self.normalization = None       # informe de normalize_grammar
 
     def add_production(self, lhs, rhs):
         if self.start_symbol is None:
@@ -38,68 +157,1659 @@ class Grammar:
 
 
 class Item:
-    def __init__(self, lhs, rhs, dot_pos, lookahead):
+    """Ítem LR con todos sus lookaheads: en cada estado hay un solo ítem por
+    núcleo (producción, punto) con el conjunto de lookaheads unido.
+    lookahead_bits es ese conjunto como bitset de terminales del parser (None
+    en los ítems LR(0)) y lookaheads la tupla de terminales, para mostrarlo y
+    para comparar ítems de parsers distintos. Guarda el número de producción
+    desde su creación, y su hash se calcula una sola vez."""
+    __slots__ = ('lhs', 'rhs', 'dot_pos', 'lookaheads', 'lookahead_bits', 'prod_id', '_hash')
+
+    def __init__(self, lhs, rhs, dot_pos, lookaheads, prod_id, lookahead_bits=None):
         self.lhs = lhs
         self.rhs = rhs
         self.dot_pos = dot_pos
-        self.lookahead = lookahead
+        self.lookaheads = lookaheads
+        self.lookahead_bits = lookahead_bits
+        self.prod_id = prod_id
+        self._hash = hash((prod_id, dot_pos, lookahead_bits))
+
+    def __getstate__(self):
+        return (self.lhs, self.rhs, self.dot_pos, self.lookaheads, self.prod_id, self.lookahead_bits)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
     def __str__(self):
         # Para producciones epsilon, siempre mostrar como completo: S -> ε •
         if self.rhs == ['ε']:
             rhs_with_dot = ['ε', '•']
         else:
             rhs_with_dot = self.rhs[:self.dot_pos] + ['•'] + self.rhs[self.dot_pos:]
-        return f"[{self.lhs} -> {' '.join(rhs_with_dot)}, {self.lookahead}]"
+        if self.lookaheads is None:
+            # Ítem LR(0) (modo SLR): sin lookahead
+            return f"[{self.lhs} -> {' '.join(rhs_with_dot)}]"
+        # '|' separa alternativas en las gramáticas, así que no puede ser un terminal
+        return f"[{self.lhs} -> {' '.join(rhs_with_dot)}, {' | '.join(self.lookaheads)}]"
+
+    @property
+    def core(self):
+        """Núcleo LR(0) del ítem: producción y posición del punto"""
+        return (self.prod_id, self.dot_pos)
     
     def __eq__(self, other):
-        return (self.lhs == other.lhs and 
-                self.rhs == other.rhs and 
-                self.dot_pos == other.dot_pos and 
-                self.lookahead == other.lookahead)
+        return (self is other or
+                (self.prod_id == other.prod_id and
+                 self.dot_pos == other.dot_pos and
+                 self.lookahead_bits == other.lookahead_bits))
     
     def __hash__(self):
-        return hash((self.lhs, tuple(self.rhs), self.dot_pos, self.lookahead))
+        return self._hash
+
+class LazyStates:
+    """Vista de los estados como clausuras, expandidas a partir de sus kernels
+    solo cuando se accede a ellas. Terminada la construcción no se memoizan
+    en el parser (que se comparte desde la caché): cada acceso usa su propio
+    depósito de ítems y un recorrido comparte uno solo."""
+    def __init__(self, parser):
+        self.parser = parser
+
+    def __len__(self):
+        return len(self.parser.kernels)
+
+    def __getitem__(self, state_id):
+        return self.parser.state_closure(self.parser.kernels[state_id])
+
+    def __iter__(self):
+        pool = {}
+        for kernel in self.parser.kernels:
+            yield self.parser.state_closure(kernel, pool)
+
+
+class ParseBudgetExceeded(Exception):
+    """El análisis superó el límite de pasos o de tiempo"""
+    def __init__(self, kind, limit, steps, position):
+        self.kind = kind            # 'steps' o 'time'
+        self.limit = limit
+        self.steps = steps
+        self.position = position    # índice del token al agotarse
+        self.partial_steps = []     # traza hasta ese momento (modo 'full')
+        if kind == 'steps':
+            message = f"Se superó el límite de {limit} pasos de análisis (token {position})"
+        else:
+            message = f"Se superó el límite de tiempo de {limit} s (token {position}, {steps} pasos)"
+        super().__init__(message)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "limit": self.limit,
+            "steps": self.steps,
+            "position": self.position
+        }
+
+
+class GrammarTooComplex(Exception):
+    """La construcción del parser superó un límite de estados, ítems o tiempo"""
+    def __init__(self, kind, limit, value, phase, estimate=None):
+        self.kind = kind            # 'states', 'items' o 'time'
+        self.limit = limit
+        self.value = value
+        self.phase = phase          # 'estimate' si lo detectó la estimación previa
+        self.estimate = estimate    # estimación LR(0), si llegó a completarse
+        units = {'states': 'estados', 'items': 'ítems', 'time': 's'}
+        stage = "la estimación previa" if phase == 'estimate' else f"la fase {phase}"
+        if kind == 'time':
+            message = f"La construcción superó el límite de tiempo de {limit} s en {stage}"
+        else:
+            message = f"La construcción superó el límite de {limit} {units[kind]} en {stage}"
+        super().__init__(message + "; use /jobs para gramáticas grandes.")
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "limit": self.limit,
+            "value": self.value,
+            "phase": self.phase,
+            "estimate": self.estimate
+        }
+
+
+# Patrones por defecto para las clases de tokens que usa la interfaz
+DEFAULT_TOKEN_PATTERNS = {
+    'num': r'\d[\d.]*',
+    'id': r'[A-Za-z_]\w*',
+}
+
+Token = namedtuple('Token', ['type', 'value', 'pos', 'line', 'column'])
+
+
+class Lexer:
+    """Analizador léxico generado a partir de los terminales de la gramática.
+
+    Los terminales literales ('(', 'if', '+=') y los patrones de tokens
+    (por defecto id y num, más los que defina el usuario) se compilan en una
+    única expresión regular, así que la entrada se recorre una sola vez.
+    Los literales se prueban de más largo a más corto y tienen prioridad sobre
+    los patrones; un literal que termina en letra o dígito solo coincide si
+    no continúa un identificador ('if' no corta 'iffy')."""
+    def __init__(self, terminals, token_patterns=None):
+        # Los patrones del usuario se prueban antes que los de por defecto
+        patterns = dict(token_patterns or {})
+        for token_type, pattern in DEFAULT_TOKEN_PATTERNS.items():
+            patterns.setdefault(token_type, pattern)
+        
+        # Un terminal vacío ('' en la gramática) no puede aparecer en la entrada
+        literals = sorted((t for t in terminals if t and t != '$' and t not in patterns),
+                          key=len, reverse=True)
+        alternatives = [r'(?P<_ws>\s+)']
+        if literals:
+            alternatives.append('(?P<_lit>' + '|'.join(
+                re.escape(t) + (r'(?!\w)' if t[-1].isalnum() or t[-1] == '_' else '')
+                for t in literals) + ')')
+        
+        self.group_types = {}
+        for i, (token_type, pattern) in enumerate(patterns.items()):
+            try:
+                compiled = re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Expresión regular inválida para el token {token_type}: {e}")
+            if compiled.match(''):
+                raise ValueError(f"El patrón del token {token_type} acepta la cadena vacía")
+            alternatives.append(f'(?P<_t{i}>{pattern})')
+            self.group_types[f'_t{i}'] = token_type
+        
+        self.regex = re.compile('|'.join(alternatives))
+        # Cuántos caracteres más allá del final de un token puede mirar la
+        # expresión para decidirlo (el literal más largo que se intentó y el
+        # carácter de (?!\w)); con patrones del usuario no hay cota conocida
+        self.reach = None if token_patterns else max(map(len, literals), default=0) + 1
+
+    def tokens(self, text, start=0):
+        """Genera los tokens de la entrada con su posición (sin el $ final)
+        desde start, que debe ser el principio de la entrada o el final de un
+        token. Un carácter no reconocido se emite como token propio para que
+        el parser informe el error en su posición."""
+        match = self.regex.match
+        group_types = self.group_types
+        pos = start
+        line = text.count('\n', 0, start) + 1
+        line_start = text.rfind('\n', 0, start) + 1
+        end = len(text)
+        
+        while pos < end:
+            m = match(text, pos)
+            if m is None:
+                yield Token(text[pos], text[pos], pos, line, pos - line_start + 1)
+                pos += 1
+                continue
+            
+            kind = m.lastgroup
+            value = m.group()
+            if kind == '_ws':
+                newlines = value.count('\n')
+                if newlines:
+                    line += newlines
+                    line_start = pos + value.rindex('\n') + 1
+            else:
+                token_type = value if kind == '_lit' else group_types[kind]
+                yield Token(token_type, value, pos, line, pos - line_start + 1)
+            pos = m.end()
+
+
+@lru_cache(maxsize=64)
+def _cached_lexer(terminals, token_patterns):
+    return Lexer(terminals, dict(token_patterns))
+
+def get_lexer(terminals, token_patterns=None):
+    """Lexer compilado para un conjunto de terminales (memoizado)"""
+    return _cached_lexer(tuple(terminals), tuple(sorted((token_patterns or {}).items())))
+
+
+class CompiledTables:
+    """Tablas ACTION/GOTO con símbolos codificados como enteros.
+
+    ACTION es un array plano de filas de tantas celdas como terminales con la
+    codificación: 0 = error, ACCEPT = aceptar, n > 0 = desplazar al estado
+    n - 1, n < 0 = reducir por la producción -n - 1. La fila del estado s
+    empieza en action_rows[s]. En las celdas con conflicto se guarda la
+    primera acción (como hace el parser) y todas sus acciones en conflicts
+    (por posición en ACTION), que usa el análisis GLR. GOTO es un array plano
+    de filas de tantas celdas como no terminales con -1 donde no hay
+    transición; la fila del estado s empieza en goto_rows[s].
+
+    Recién construidas las tablas son densas (la fila s empieza en
+    s × columnas); compress() las compacta sin cambiar el acceso, y entonces
+    las celdas de GOTO sin transición pueden tener el valor de otra fila."""
+    ACCEPT = 2 ** 31 - 1
+    ARRAYS = ('action', 'goto', 'action_rows', 'goto_rows', 'prod_lhs', 'prod_len')
+
+    def __init__(self, parser):
+        terminals = sorted(parser.grammar.terminals | {'$'})
+        non_terminals = sorted(parser.grammar.non_terminals)
+        self.mode = parser.mode
+        self.productions = parser.grammar.productions
+        self.terminals = terminals
+        self.non_terminals = non_terminals
+        self.terminal_ids = {t: i for i, t in enumerate(terminals)}
+        self.non_terminal_ids = {nt: i for i, nt in enumerate(non_terminals)}
+        self.n_states = len(parser.kernels)
+        self.n_terminals = len(terminals)
+        self.n_non_terminals = len(non_terminals)
+        
+        self.action = array('i', bytes(4 * self.n_states * self.n_terminals))
+        self.conflicts = {}     # celda de ACTION -> códigos de todas sus acciones
+        for state_id, actions in parser.action_table.items():
+            row = state_id * self.n_terminals
+            for symbol, action in actions.items():
+                cell = row + self.terminal_ids[symbol]
+                if action[0] == 'conflict':
+                    self.conflicts[cell] = tuple(self.encode(*a) for a in action[1])
+                    action = action[1][0]
+                self.action[cell] = self.encode(*action)
+        
+        self.goto = array('i', [-1]) * (self.n_states * self.n_non_terminals)
+        for (state_id, symbol), target in parser.goto_table.items():
+            symbol_id = self.non_terminal_ids.get(symbol)
+            if symbol_id is not None:
+                self.goto[state_id * self.n_non_terminals + symbol_id] = target
+        self.action_rows = array('i', range(0, self.n_states * self.n_terminals, self.n_terminals))
+        self.goto_rows = array('i', range(0, self.n_states * self.n_non_terminals, self.n_non_terminals))
+        self.compression = None         # informe de compress()
+        # estado -> bits de las columnas con reducción por defecto (error en
+        # las tablas densas); la traza completa las trata como error
+        self.default_cells = {}
+        # Cadenas unitarias sustituidas al normalizar la gramática
+        self.unit_chains = dict(parser.grammar.unit_chains)
+        
+        # Datos de cada reducción precalculados: lhs y cuántos estados sacar
+        self.prod_lhs = array('i', (self.non_terminal_ids[lhs]
+                                    for lhs, _ in parser.grammar.productions))
+        self.prod_len = array('i', (0 if rhs == ['ε'] else len(rhs)
+                                    for _, rhs in parser.grammar.productions))
+
+    def export(self, path):
+        """Guarda las tablas en un artefacto binario versionado:
+        cabecera (magic, versión, longitud de metadatos), metadatos JSON con
+        la tabla de símbolos y las producciones, y luego los arrays int32
+        little-endian ACTION, GOTO, inicio de las filas de cada estado en
+        ACTION y en GOTO, lhs y longitud de cada producción."""
+        meta = json.dumps({
+            "mode": self.mode,
+            "terminals": self.terminals,
+            "non_terminals": self.non_terminals,
+            "productions": [[lhs, rhs] for lhs, rhs in self.productions],
+            "n_states": self.n_states,
+            "action_size": len(self.action),
+            "goto_size": len(self.goto),
+            "compression": self.compression,
+            "default_cells": [[state, mask] for state, mask in sorted(self.default_cells.items())],
+            "unit_chains": [[lhs, list(rhs), list(unit_chain)] for (lhs, rhs), unit_chain in self.unit_chains.items()],
+            "conflicts": [[cell, list(codes)] for cell, codes in sorted(self.conflicts.items())]
+        }, ensure_ascii=False).encode('utf-8')
+        meta += b' ' * (-len(meta) % 4)     # alinear los arrays a 4 bytes
+        
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('<4sII', ARTIFACT_MAGIC, ARTIFACT_VERSION, len(meta)))
+            f.write(meta)
+            for name in self.ARRAYS:
+                values = array('i', getattr(self, name))
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                f.write(values.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Carga un artefacto mediante mmap; en máquinas little-endian las
+        tablas se leen directamente del archivo mapeado, sin copiarlas"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        header_size = struct.calcsize('<4sII')
+        magic, version, meta_len = struct.unpack_from('<4sII', mapped, 0)
+        if magic != ARTIFACT_MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} no es un artefacto de tablas LR")
+        if version != ARTIFACT_VERSION:
+            mapped.close()
+            raise ValueError(f"Versión de artefacto no soportada: {version}; vuelva a exportar la gramática")
+        meta = json.loads(bytes(mapped[header_size:header_size + meta_len]).decode('utf-8'))
+        
+        tables = cls.__new__(cls)
+        tables._mmap = mapped
+        tables.mode = meta["mode"]
+        tables.terminals = meta["terminals"]
+        tables.non_terminals = meta["non_terminals"]
+        tables.productions = [(lhs, rhs) for lhs, rhs in meta["productions"]]
+        tables.terminal_ids = {t: i for i, t in enumerate(tables.terminals)}
+        tables.non_terminal_ids = {nt: i for i, nt in enumerate(tables.non_terminals)}
+        tables.n_states = meta["n_states"]
+        tables.n_terminals = len(tables.terminals)
+        tables.n_non_terminals = len(tables.non_terminals)
+        tables.conflicts = {cell: tuple(codes) for cell, codes in meta["conflicts"]}
+        tables.compression = meta["compression"]
+        tables.default_cells = {state: mask for state, mask in meta["default_cells"]}
+        tables.unit_chains = {(lhs, tuple(rhs)): tuple(unit_chain)
+                              for lhs, rhs, unit_chain in meta["unit_chains"]}
+        
+        counts = (meta["action_size"], meta["goto_size"], tables.n_states, tables.n_states,
+                  len(tables.productions), len(tables.productions))
+        view = memoryview(mapped)
+        offset = header_size + meta_len
+        for name, count in zip(cls.ARRAYS, counts):
+            chunk = view[offset:offset + 4 * count]
+            if sys.byteorder == 'little':
+                values = chunk.cast('i')
+            else:
+                values = array('i', chunk.tobytes())
+                values.byteswap()
+            setattr(tables, name, values)
+            offset += 4 * count
+        return tables
+
+    @classmethod
+    def encode(cls, action_type, value):
+        if action_type == 'shift':
+            return value + 1
+        if action_type == 'reduce':
+            return -value - 1
+        return cls.ACCEPT
+
+    def __getstate__(self):
+        # Las tablas cargadas con mmap se copian a arrays para poder enviarlas
+        # a otros procesos
+        state = dict(self.__dict__)
+        state.pop('_mmap', None)
+        for name in self.ARRAYS:
+            state[name] = array('i', state[name])
+        return state
+
+    def same_as(self, other):
+        """True si ambas tablas son idénticas (símbolos, producciones y arrays)"""
+        return (self.mode == other.mode and
+                self.terminals == other.terminals and
+                self.non_terminals == other.non_terminals and
+                self.conflicts == other.conflicts and
+                self.default_cells == other.default_cells and
+                self.unit_chains == other.unit_chains and
+                [[lhs, list(rhs)] for lhs, rhs in self.productions] ==
+                [[lhs, list(rhs)] for lhs, rhs in other.productions] and
+                all(array('i', getattr(self, name)) == array('i', getattr(other, name))
+                    for name in self.ARRAYS))
+
+    def table_bytes(self):
+        """Bytes que ocupan los arrays de las tablas"""
+        return sum(4 * len(getattr(self, name)) for name in self.ARRAYS)
+
+    def compress(self):
+        """Compacta las tablas sin cambiar el análisis de las entradas aceptadas:
+
+        - Reducciones por defecto: en un estado que reduce, las celdas de error
+          pasan a ser su reducción más frecuente. Como en yacc, un token
+          erróneo provoca a lo sumo alguna reducción más y el error se detecta
+          antes de desplazarlo, en la misma posición. No se aplican si hay
+          conflictos, para que el análisis GLR no siga reducciones de más.
+        - Las filas iguales de ACTION (con sus conflictos) se guardan una vez.
+        - GOTO se empaqueta por desplazamiento (comb): las filas distintas se
+          solapan de modo que sus transiciones no choquen. Las celdas sin
+          transición quedan con el valor de otra fila, así que no hace falta
+          vector de comprobación: GOTO solo se consulta tras reducir por
+          A -> α, y el estado que queda en la cima tiene transición con A.
+
+        El acceso sigue siendo un índice (action_rows[s] + columna), por lo
+        que analizar con las tablas compactadas cuesta lo mismo. Devuelve el
+        informe de tamaños, que queda en compression."""
+        if self.compression is not None:
+            return self.compression
+        dense_bytes = self.table_bytes()
+        n_terminals = self.n_terminals
+        n_non_terminals = self.n_non_terminals
+        
+        # ACTION: reducciones por defecto y filas repetidas una sola vez
+        action = array('i')
+        action_rows = array('i')
+        conflicts = {}
+        default_cells = {}
+        row_starts = {}         # (fila, conflictos) -> inicio en el nuevo ACTION
+        default_reductions = 0
+        for state in range(self.n_states):
+            start = self.action_rows[state]
+            row = list(self.action[start:start + n_terminals])
+            row_conflicts = tuple((column, self.conflicts[start + column])
+                                  for column in range(n_terminals)
+                                  if start + column in self.conflicts) if self.conflicts else ()
+            if not self.conflicts and 0 in row:
+                reductions = [code for code in row if code < 0]
+                if reductions:
+                    # La más frecuente; a igualdad, la de la producción de menor número
+                    default = max(set(reductions), key=lambda code: (reductions.count(code), code))
+                    default_cells[state] = sum(1 << column for column, code in enumerate(row) if not code)
+                    row = [code or default for code in row]
+                    default_reductions += 1
+            key = (tuple(row), row_conflicts)
+            row_start = row_starts.get(key)
+            if row_start is None:
+                row_start = row_starts[key] = len(action)
+                action.extend(row)
+                for column, codes in row_conflicts:
+                    conflicts[row_start + column] = codes
+            action_rows.append(row_start)
+        
+        # GOTO: cada fila distinta en el primer desplazamiento donde sus
+        # transiciones caben; primero las filas con más transiciones
+        rows = []
+        for state in range(self.n_states):
+            start = self.goto_rows[state]
+            rows.append(tuple(self.goto[start:start + n_non_terminals]))
+        unique_rows = sorted(dict.fromkeys(rows), key=lambda row: -sum(target >= 0 for target in row))
+        goto = []
+        row_bases = {}
+        occupied = 0            # bit i: celda i de GOTO ya ocupada
+        first_free = 0
+        for row in unique_rows:
+            mask = 0
+            for column, target in enumerate(row):
+                if target >= 0:
+                    mask |= 1 << column
+            first_column = (mask & -mask).bit_length() - 1
+            base = max(0, first_free - first_column) if mask else 0
+            for _ in range(64):
+                if not (occupied >> base) & mask:
+                    break
+                # Siguiente desplazamiento con la primera columna en una celda libre
+                free = ~occupied >> (base + first_column + 1)
+                base += (free & -free).bit_length()
+            else:
+                # Sin hueco en los primeros intentos (filas densas): al final
+                base = max(0, occupied.bit_length() - first_column)
+            occupied |= mask << base
+            if base + n_non_terminals > len(goto):
+                goto.extend([-1] * (base + n_non_terminals - len(goto)))
+            for column, target in enumerate(row):
+                if target >= 0:
+                    goto[base + column] = target
+            while (occupied >> first_free) & 1:
+                first_free += 1
+            row_bases[row] = base
+        
+        self.action = action
+        self.action_rows = action_rows
+        self.conflicts = conflicts
+        self.default_cells = default_cells
+        self.goto = array('i', goto)
+        self.goto_rows = array('i', (row_bases[row] for row in rows))
+        self.compression = {
+            "dense_bytes": dense_bytes,
+            "bytes": self.table_bytes(),
+            "action_rows": len(row_starts),
+            "goto_rows": len(unique_rows),
+            "default_reductions": default_reductions,
+        }
+        return self.compression
+
+    def covers(self, dense):
+        """True si estas tablas analizan igual que las tablas densas `dense`
+        toda entrada que `dense` acepta: cada celda de ACTION es la misma o,
+        si está en default_cells, `dense` da error y la celda es una reducción
+        que el estado ya hace con otro token; los conflictos son los mismos y
+        GOTO coincide en todas las transiciones de `dense`"""
+        if (self.n_states != dense.n_states or self.terminals != dense.terminals or
+                self.non_terminals != dense.non_terminals or
+                array('i', self.prod_lhs) != array('i', dense.prod_lhs) or
+                array('i', self.prod_len) != array('i', dense.prod_len)):
+            return False
+        n_terminals = self.n_terminals
+        n_non_terminals = self.n_non_terminals
+        for state in range(self.n_states):
+            start = self.action_rows[state]
+            dense_start = dense.action_rows[state]
+            dense_row = list(dense.action[dense_start:dense_start + n_terminals])
+            defaults = self.default_cells.get(state, 0)
+            for column, dense_code in enumerate(dense_row):
+                code = self.action[start + column]
+                if (defaults >> column) & 1:
+                    if dense_code != 0 or code >= 0 or code not in dense_row:
+                        return False
+                elif code != dense_code:
+                    return False
+                if self.conflicts.get(start + column) != dense.conflicts.get(dense_start + column):
+                    return False
+            start = self.goto_rows[state]
+            dense_start = dense.goto_rows[state]
+            for column in range(n_non_terminals):
+                target = dense.goto[dense_start + column]
+                if target >= 0 and self.goto[start + column] != target:
+                    return False
+        return True
+
+    def lookup(self, state, token):
+        """Código ACTION de (estado, token); 0 si el token es desconocido"""
+        token_id = self.terminal_ids.get(token)
+        if token_id is None:
+            return 0
+        return self.action[self.action_rows[state] + token_id]
+
+    def original_tree(self, tree):
+        """El árbol en términos de la gramática original: vuelve a poner los
+        nodos de las cadenas unitarias que sustituyó normalize_grammar. Una
+        producción se reconoce por su lhs y los símbolos de sus hijos, que no
+        se repiten en una gramática normalizada. Modifica el árbol."""
+        if not self.unit_chains or tree is None:
+            return tree
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            children = node["children"]
+            if not children:
+                continue
+            unit_chain = self.unit_chains.get((node["symbol"], tuple(child["symbol"] for child in children)))
+            if unit_chain:
+                wrapped = children
+                for symbol in reversed(unit_chain):
+                    wrapped = [{"symbol": symbol, "children": wrapped}]
+                node["children"] = wrapped
+            stack.extend(children)
+        return tree
+
+    def tokenize(self, input_string, token_patterns=None):
+        """Genera los tokens de la entrada según los terminales de la gramática"""
+        return get_lexer(self.terminals, token_patterns).tokens(input_string)
+
+    def parse(self, input_string, token_patterns=None, trace='full',
+              max_steps=None, time_limit=None):
+        """Tokeniza la cadena y la analiza con estas tablas.
+        trace: 'none' (solo aceptar/rechazar), 'tree' (árbol sin pasos) o
+        'full' (pasos y árbol). Devuelve (aceptada, pasos, árbol) y lanza
+        ParseBudgetExceeded si se agota el presupuesto."""
+        if trace not in TRACE_LEVELS:
+            raise ValueError(f"Nivel de traza desconocido: {trace}")
+        token_types = (token.type for token in self.tokenize(input_string, token_patterns))
+        
+        if trace == 'full':
+            tokens = list(token_types)
+            tokens.append('$')
+            return self.run(tokens, max_steps, time_limit)
+        
+        accepted, _, tree = self.recognize(chain(token_types, ('$',)),
+                                           build_tree=(trace == 'tree'),
+                                           max_steps=max_steps, time_limit=time_limit)
+        return accepted, [], tree
+
+    def recognize(self, tokens, build_tree=False, max_steps=None, time_limit=None):
+        """Analiza sin registrar pasos. tokens es cualquier iterable de tipos de
+        token terminado en $ y se consume de forma perezosa; sin árbol, lo único
+        que crece es la pila de estados. Devuelve (aceptada, índice del token
+        con error, árbol) y lanza ParseBudgetExceeded si se agota el presupuesto."""
+        action_table = self.action
+        goto_table = self.goto
+        action_rows = self.action_rows
+        goto_rows = self.goto_rows
+        prod_lhs = self.prod_lhs
+        prod_len = self.prod_len
+        terminal_ids = self.terminal_ids
+        accept = CompiledTables.ACCEPT
+        max_steps = PARSE_MAX_STEPS if max_steps is None else max_steps
+        time_limit = PARSE_TIME_LIMIT if time_limit is None else time_limit
+        deadline = perf_counter() + time_limit
+        
+        tokens = iter(tokens)
+        token = next(tokens)
+        token_id = terminal_ids.get(token, -1)
+        stack = [0]
+        tree_stack = []
+        i = 0
+        steps = 0
+        
+        try:
+            while True:
+                steps += 1
+                if steps > max_steps:
+                    raise ParseBudgetExceeded('steps', max_steps, steps - 1, i)
+                if not steps & 1023 and perf_counter() > deadline:
+                    raise ParseBudgetExceeded('time', time_limit, steps, i)
+            
+                code = action_table[action_rows[stack[-1]] + token_id] if token_id >= 0 else 0
+            
+                if code == 0:
+                    return False, i, None
+            
+                if code == accept:
+                    return True, None, self.original_tree(tree_stack[-1] if tree_stack else None)
+            
+                if code > 0:
+                    stack.append(code - 1)
+                    if build_tree:
+                        tree_stack.append({"symbol": token, "children": []})
+                    i += 1
+                    token = next(tokens)
+                    token_id = terminal_ids.get(token, -1)
+                else:
+                    value = -code - 1
+                    length = prod_len[value]
+                    if length:
+                        del stack[-length:]
+                    if build_tree:
+                        if length:
+                            children = tree_stack[-length:]
+                            del tree_stack[-length:]
+                        else:
+                            children = [{"symbol": "ε", "children": []}]
+                        tree_stack.append({
+                            "symbol": self.non_terminals[prod_lhs[value]],
+                            "children": children
+                        })
+                    target = goto_table[goto_rows[stack[-1]] + prod_lhs[value]]
+                    if target < 0:
+                        return False, i, None
+                    stack.append(target)
+        finally:
+            metrics.count_parse(steps, i)
+
+    def glr_parse(self, input_string, token_patterns=None, max_steps=None, time_limit=None):
+        """Tokeniza la cadena y la analiza con GLR (ver glr_recognize)"""
+        tokens = [token.type for token in self.tokenize(input_string, token_patterns)]
+        tokens.append('$')
+        return self.glr_recognize(tokens, max_steps, time_limit)
+
+    def glr_recognize(self, tokens, max_steps=None, time_limit=None):
+        """Análisis GLR sobre una lista de tokens terminada en $: en las celdas
+        con conflicto se siguen todas las acciones a la vez sobre una pila
+        estructurada en grafo (GSS) y los árboles se comparten en un bosque
+        empaquetado (ParseForest), así que el coste es polinómico aunque la
+        entrada tenga un número exponencial de derivaciones. Mientras hay una
+        sola cima y las celdas no tienen conflicto se avanza como un LR.
+        Devuelve (aceptada, índice del token con error, bosque); si se acepta,
+        forest.root es el nodo raíz. Cada desplazamiento o reducción cuenta
+        como un paso del presupuesto."""
+        action_table = self.action
+        goto_table = self.goto
+        action_rows = self.action_rows
+        goto_rows = self.goto_rows
+        conflicts = self.conflicts
+        prod_lhs = self.prod_lhs
+        prod_len = self.prod_len
+        non_terminals = self.non_terminals
+        accept = CompiledTables.ACCEPT
+        max_steps = PARSE_MAX_STEPS if max_steps is None else max_steps
+        time_limit = PARSE_TIME_LIMIT if time_limit is None else time_limit
+        deadline = perf_counter() + time_limit
+        
+        forest = ParseForest(self.productions)
+        forest_index = forest.index
+        forest_nodes = forest.nodes
+        forest_alternatives = forest.alternatives
+        
+        def derive(symbol, start, end, prod_id, children):
+            # Nodo del bosque (símbolo, inicio, fin) con una alternativa más
+            key = (symbol, start, end)
+            node_id = forest_index.get(key)
+            if node_id is None:
+                node_id = forest_index[key] = len(forest_nodes)
+                forest_nodes.append(key)
+                forest_alternatives.append([(prod_id, children)])
+            elif (prod_id, children) not in forest_alternatives[node_id]:
+                forest_alternatives[node_id].append((prod_id, children))
+            return node_id
+        
+        token_ids = [self.terminal_ids.get(token, -1) for token in tokens]
+        bottom = GSSNode(0, 0)
+        frontier = {0: bottom}      # estado -> nodo del nivel actual
+        steps = 0
+        i = 0
+        
+        try:
+            while True:
+                token_id = token_ids[i]
+                if token_id < 0:
+                    return False, i, forest
+            
+                # Tramo determinista: una sola cima y celdas sin conflicto
+                if len(frontier) == 1:
+                    node, = frontier.values()
+                    while True:
+                        cell = action_rows[node.state] + token_id
+                        if cell in conflicts:
+                            break
+                        code = action_table[cell]
+                        steps += 1
+                        if steps > max_steps:
+                            raise ParseBudgetExceeded('steps', max_steps, steps - 1, i)
+                        if not steps & 1023 and perf_counter() > deadline:
+                            raise ParseBudgetExceeded('time', time_limit, steps, i)
+                    
+                        if code == 0:
+                            return False, i, forest
+                        if code == accept:
+                            forest.root = node.edges.get(bottom)
+                            return forest.root is not None, None, forest
+                        if code > 0:
+                            leaf = forest.node(tokens[i], i, i + 1)
+                            shifted = GSSNode(code - 1, i + 1)
+                            shifted.edges[node] = leaf
+                            node = shifted
+                            frontier = {node.state: node}
+                            i += 1
+                            token_id = token_ids[i]
+                            if token_id < 0:
+                                return False, i, forest
+                            continue
+                    
+                        prod_id = -code - 1
+                        length = prod_len[prod_id]
+                        start = node
+                        labels = []
+                        while length and len(start.edges) == 1:
+                            (start, label), = start.edges.items()
+                            labels.append(label)
+                            length -= 1
+                        if length:
+                            break       # varios caminos: se reduce en el caso general
+                        target = goto_table[goto_rows[start.state] + prod_lhs[prod_id]]
+                        if target < 0:
+                            return False, i, forest
+                        if target in frontier:
+                            break       # arista hacia un nodo del nivel: caso general
+                        labels.reverse()
+                        reduced = derive(non_terminals[prod_lhs[prod_id]], start.level, i, prod_id,
+                                         tuple(labels) or (forest.node('ε', i, i),))
+                        node = GSSNode(target, i)
+                        node.edges[start] = reduced
+                        frontier[target] = node
+            
+                # Caso general: reducciones hasta que el nivel no cambie; una arista
+                # nueva hacia un nodo ya procesado obliga a revisar todo el nivel.
+                # Repetir una reducción no cambia nada (la alternativa y la arista
+                # ya existen); solo al revisar se recuerdan las hechas para no
+                # repetir trabajo.
+                pending = list(frontier.values())
+                done = None             # reducciones hechas: (nodo, prod, destino, hijos)
+                shifts = {}             # nodo -> estado al que desplaza
+                root = None
+                while pending:
+                    node = pending.pop()
+                    cell = action_rows[node.state] + token_id
+                    for code in conflicts.get(cell) or (action_table[cell],):
+                        if code == accept:
+                            root = node.edges.get(bottom, root)
+                            continue
+                        if code > 0:
+                            shifts[node] = code - 1
+                            continue
+                        if code == 0:
+                            continue
+                    
+                        prod_id = -code - 1
+                        lhs = prod_lhs[prod_id]
+                        paths = [(node, ())]
+                        for _ in range(prod_len[prod_id]):
+                            paths = [(previous, (label,) + labels)
+                                     for current, labels in paths
+                                     for previous, label in current.edges.items()]
+                        for start, children in paths:
+                            if done is not None:
+                                key = (node, prod_id, start, children)
+                                if key in done:
+                                    continue
+                                done.add(key)
+                            steps += 1
+                            if steps > max_steps:
+                                raise ParseBudgetExceeded('steps', max_steps, steps - 1, i)
+                            if not steps & 1023 and perf_counter() > deadline:
+                                raise ParseBudgetExceeded('time', time_limit, steps, i)
+                        
+                            target = goto_table[goto_rows[start.state] + lhs]
+                            if target < 0:
+                                continue
+                            reduced = derive(non_terminals[lhs], start.level, i, prod_id,
+                                             children or (forest.node('ε', i, i),))
+                            existing = frontier.get(target)
+                            if existing is None:
+                                existing = GSSNode(target, i)
+                                existing.edges[start] = reduced
+                                frontier[target] = existing
+                                pending.append(existing)
+                            elif start not in existing.edges:
+                                existing.edges[start] = reduced
+                                pending.extend(frontier.values())
+                                if done is None:
+                                    done = set()
+            
+                if root is not None:
+                    forest.root = root
+                    return True, None, forest
+            
+                # Desplazamientos: el nuevo nivel comparte la hoja del token
+                steps += len(shifts)
+                if steps > max_steps:
+                    raise ParseBudgetExceeded('steps', max_steps, steps - len(shifts), i)
+                leaf = forest.node(tokens[i], i, i + 1)
+                frontier = {}
+                for node, target in shifts.items():
+                    shifted = frontier.get(target)
+                    if shifted is None:
+                        shifted = frontier[target] = GSSNode(target, i + 1)
+                    shifted.edges[node] = leaf
+                if not frontier:
+                    return False, i, forest
+                i += 1
+        finally:
+            metrics.count_parse(steps, i)
+
+    def iter_steps(self, tokens, build_tree=True, max_steps=None, time_limit=None):
+        """Genera los pasos del análisis uno a uno sobre una lista de tokens
+        terminada en $. Cada paso es {"step", "stack", "position", "token",
+        "action"}, donde "position" es el índice del primer token de la
+        entrada restante. El último registro es el resultado:
+        {"accepted", "error_position", "parse_tree"}, con "budget_exceeded"
+        si se agotó el presupuesto. Solo se mantienen las pilas, así que cada
+        paso cuesta O(profundidad de la pila)."""
+        action_table = self.action
+        goto_table = self.goto
+        action_rows = self.action_rows
+        goto_rows = self.goto_rows
+        prod_lhs = self.prod_lhs
+        prod_len = self.prod_len
+        accept = CompiledTables.ACCEPT
+        non_terminals = self.non_terminals
+        terminal_ids = self.terminal_ids
+        default_cells = self.default_cells
+        max_steps = PARSE_MAX_STEPS if max_steps is None else max_steps
+        time_limit = PARSE_TIME_LIMIT if time_limit is None else time_limit
+        deadline = perf_counter() + time_limit
+        
+        stack = [0]
+        symbol_stack = []
+        parse_tree_stack = []
+        
+        i = 0
+        step_count = 0
+        try:
+            while i < len(tokens):
+                if step_count >= max_steps:
+                    yield {"accepted": False, "error_position": i, "parse_tree": None,
+                           "budget_exceeded": ParseBudgetExceeded('steps', max_steps, step_count, i).to_dict()}
+                    return
+                step_count += 1
+                if not step_count & 1023 and perf_counter() > deadline:
+                    yield {"accepted": False, "error_position": i, "parse_tree": None,
+                           "budget_exceeded": ParseBudgetExceeded('time', time_limit, step_count, i).to_dict()}
+                    return
+                state = stack[-1]
+                token = tokens[i]
+                token_id = terminal_ids.get(token, -1)
+                code = action_table[action_rows[state] + token_id] if token_id >= 0 else 0
+                if code < 0 and (default_cells.get(state, 0) >> token_id) & 1:
+                    # Reducción por defecto: la traza sigue a la tabla ACTION
+                    # mostrada, que tiene error en esta celda
+                    code = 0
+            
+                if code == 0:
+                    yield {
+                        "step": step_count,
+                        "stack": ' '.join(symbol_stack) if symbol_stack else '0',
+                        "position": i,
+                        "token": token,
+                        "action": "ERROR"
+                    }
+                    yield {"accepted": False, "error_position": i, "parse_tree": None}
+                    return
+            
+                if code == accept:
+                    yield {
+                        "step": step_count,
+                        "stack": ' '.join(symbol_stack) if symbol_stack else '0',
+                        "position": i,
+                        "token": token,
+                        "action": "acc"
+                    }
+                    tree = self.original_tree(parse_tree_stack[-1] if parse_tree_stack else None)
+                    yield {"accepted": True, "error_position": None, "parse_tree": tree}
+                    return
+            
+                if code > 0:
+                    # SHIFT
+                    value = code - 1
+                    stack.append(value)
+                    symbol_stack.append(token)
+                    if build_tree:
+                        parse_tree_stack.append({
+                            "symbol": token,
+                            "children": []
+                        })
+                    yield {
+                        "step": step_count,
+                        "stack": ' '.join(symbol_stack),
+                        "position": i,
+                        "token": token,
+                        "action": f"s{value}"
+                    }
+                    i += 1
+                
+                else:
+                    # REDUCE
+                    value = -code - 1
+                    lhs = non_terminals[prod_lhs[value]]
+                    length = prod_len[value]
+                
+                    if length:
+                        del symbol_stack[-length:]
+                        del stack[-length:]
+                
+                    if build_tree:
+                        if length:
+                            children = parse_tree_stack[-length:]
+                            del parse_tree_stack[-length:]
+                        else:
+                            # Producción epsilon: no se hace pop
+                            children = [{"symbol": "ε", "children": []}]
+                        parse_tree_stack.append({
+                            "symbol": lhs,
+                            "children": children
+                        })
+                    symbol_stack.append(lhs)
+                
+                    current_state = stack[-1] if stack else 0
+                    target = goto_table[goto_rows[current_state] + prod_lhs[value]]
+                    if target >= 0:
+                        stack.append(target)
+                
+                    yield {
+                        "step": step_count,
+                        "stack": ' '.join(symbol_stack),
+                        "position": i,
+                        "token": token,
+                        "action": f"r{value + 1}"
+                    }
+        
+            yield {"accepted": False, "error_position": i, "parse_tree": None}
+        finally:
+            metrics.count_parse(step_count, i)
+
+    def run(self, tokens, max_steps=None, time_limit=None):
+        """Ejecuta el autómata sobre una lista de tokens terminada en $.
+        Devuelve (aceptada, pasos, árbol)."""
+        steps = []
+        for record in self.iter_steps(tokens, max_steps=max_steps, time_limit=time_limit):
+            if "accepted" in record:
+                budget = record.get("budget_exceeded")
+                if budget:
+                    error = ParseBudgetExceeded(**budget)
+                    error.partial_steps = steps
+                    raise error
+                return record["accepted"], steps, record["parse_tree"]
+            steps.append({
+                "step": record["step"],
+                "stack": record["stack"],
+                "input": '$' if record["action"] == "acc" else ' '.join(tokens[record["position"]:]),
+                "action": record["action"]
+            })
+
+    def parse_incremental(self, input_string, token_patterns=None, base=None,
+                          max_steps=None, time_limit=None):
+        """Analiza la cadena reutilizando base, el ParsedDocument de una
+        versión anterior analizada con estas tablas y los mismos patrones de
+        tokens (sin base, o con uno que no cumple eso, analiza la cadena
+        entera). Solo se vuelven a tokenizar los tokens que la edición pudo
+        cambiar y la entrada del autómata son los subárboles de base a ambos
+        lados de ese tramo: un subárbol se desplaza entero si el estado en la
+        cima de la pila y el token que lo sigue son los mismos con los que se
+        construyó y, si no, se descompone en sus hijos (LR incremental por
+        coincidencia de estados). El coste sigue al tamaño de la edición y a
+        la profundidad del árbol, no a la longitud de la entrada. Cada paso es
+        un desplazamiento, una reducción o la descomposición de un subárbol.
+        Devuelve el nuevo ParsedDocument y lanza ParseBudgetExceeded si se
+        agota el presupuesto."""
+        lexer = get_lexer(self.terminals, token_patterns)
+        patterns = dict(token_patterns or {})
+        if base is not None and (base.tables is not self or base.token_patterns != patterns):
+            base = None
+        if base is None:
+            pending = []
+            end = 0
+            for token in lexer.tokens(input_string):
+                token_end = token.pos + len(token.value)
+                pending.append(SyntaxNode.leaf(token.type, token_end - end))
+                end = token_end
+            relexed = len(pending)
+            pending.reverse()
+        else:
+            pending, relexed = self._edit_stream(base, input_string, lexer)
+
+        action_table = self.action
+        goto_table = self.goto
+        action_rows = self.action_rows
+        goto_rows = self.goto_rows
+        prod_lhs = self.prod_lhs
+        prod_len = self.prod_len
+        terminal_ids = self.terminal_ids
+        non_terminals = self.non_terminals
+        accept = CompiledTables.ACCEPT
+        max_steps = PARSE_MAX_STEPS if max_steps is None else max_steps
+        time_limit = PARSE_TIME_LIMIT if time_limit is None else time_limit
+        deadline = perf_counter() + time_limit
+
+        stack = [0]
+        nodes = []      # subárboles de la pila, en paralelo a los estados
+        i = 0
+        steps = 0
+        reused = reused_tokens = 0
+        try:
+            while True:
+                steps += 1
+                if steps > max_steps:
+                    raise ParseBudgetExceeded('steps', max_steps, steps - 1, i)
+                if not steps & 1023 and perf_counter() > deadline:
+                    raise ParseBudgetExceeded('time', time_limit, steps, i)
+
+                state = stack[-1]
+                item = pending[-1] if pending else None
+                if item is None:
+                    lookahead = '$'
+                elif item.production < 0:
+                    lookahead = item.symbol
+                else:
+                    # Tipo del primer token después del subárbol
+                    k = len(pending) - 2
+                    while k >= 0 and pending[k].first is None:
+                        k -= 1
+                    following = pending[k].first if k >= 0 else '$'
+                    if item.state == state and item.lookahead == following:
+                        # El autómata volvería a construirlo igual: se desplaza entero
+                        pending.pop()
+                        stack.append(goto_table[goto_rows[state] + prod_lhs[item.production]])
+                        nodes.append(item)
+                        i += item.tokens
+                        reused += 1
+                        reused_tokens += item.tokens
+                        continue
+                    lookahead = item.first or following
+
+                token_id = terminal_ids.get(lookahead, -1)
+                code = action_table[action_rows[state] + token_id] if token_id >= 0 else 0
+
+                if code < 0:
+                    value = -code - 1
+                    length = prod_len[value]
+                    width = tokens = 0
+                    first = None
+                    if length:
+                        children = nodes[-length:]
+                        del nodes[-length:]
+                        del stack[-length:]
+                        for child in children:
+                            width += child.width
+                            tokens += child.tokens
+                            if first is None:
+                                first = child.first
+                    else:
+                        children = ()
+                    state = stack[-1]
+                    nodes.append(SyntaxNode(non_terminals[prod_lhs[value]], value, children,
+                                            state, lookahead, first, width, tokens))
+                    target = goto_table[goto_rows[state] + prod_lhs[value]]
+                    if target < 0:
+                        break
+                    stack.append(target)
+                    continue
+
+                if item is not None and item.production >= 0:
+                    # Desplazamiento o error con el subárbol delante: se sigue con sus hijos
+                    pending.pop()
+                    pending.extend(reversed(item.children))
+                    continue
+
+                if code == 0 or code == accept:
+                    break
+                stack.append(code - 1)
+                nodes.append(pending.pop())
+                i += 1
+        finally:
+            metrics.count_parse(steps, i)
+            metrics.inc('lr1_parse_reused_tokens_total', reused_tokens)
+
+        accepted = code == accept
+        pending.reverse()
+        return ParsedDocument(self, input_string, patterns, nodes + pending, accepted,
+                              None if accepted else i, {
+                                  "incremental": base is not None,
+                                  "relexed_tokens": relexed,
+                                  "reused_subtrees": reused,
+                                  "reused_tokens": reused_tokens,
+                                  "steps": steps
+                              })
+
+    @staticmethod
+    def _edit_stream(base, text, lexer):
+        """Entrada del reanálisis de text como pila (el siguiente elemento al
+        final): los subárboles de base anteriores al primer token que cambió,
+        las hojas de los tokens vueltos a tokenizar y los subárboles de base
+        desde el primer token que vuelve a coincidir. Devuelve (pila, número
+        de tokens vueltos a tokenizar)."""
+        prefix, suffix = common_affixes(base.text, text)
+        delta = len(text) - len(base.text)
+        new_end = len(text) - suffix        # desde aquí el texto es el de antes
+
+        # Se vuelve a tokenizar desde el primer token que pudo cambiar: el que
+        # toca el tramo editado o está a menos de reach caracteres de él
+        limit = -1 if lexer.reach is None else prefix - lexer.reach
+        old_leaves = syntax_leaves(base.forest, limit)
+        current = next(old_leaves, None)    # (posición, hoja) de base
+        left_end = current[0] if current is not None else base.width
+        old_sync = base.width
+        new_leaves = []
+        relexed = 0
+        end = left_end
+        for token in lexer.tokens(text, left_end):
+            relexed += 1
+            token_end = token.pos + len(token.value)
+            width = token_end - end
+            if (not new_leaves and current is not None and current[0] == end and
+                    current[1].symbol == token.type and current[1].width == width):
+                # Mismo tipo y mismo ancho que antes: para el parser no cambió
+                left_end = token_end
+                current = next(old_leaves, None)
+            else:
+                new_leaves.append(SyntaxNode.leaf(token.type, width))
+            end = token_end
+            if end > new_end:
+                # El texto que sigue es el de antes: si ahí empezaba un token
+                # de base, desde él los tokens son los mismos
+                boundary = end - delta
+                while current is not None and current[0] < boundary:
+                    current = next(old_leaves, None)
+                if current is not None and current[0] == boundary:
+                    old_sync = boundary
+                    break
+                if current is None and boundary >= base.width:
+                    break
+
+        # Subárboles máximos de base a cada lado del tramo cambiado
+        left = []
+        right = []
+        stack = base.forest[::-1]
+        offset = 0
+        while stack:
+            node = stack.pop()
+            node_end = offset + node.width
+            if node_end <= left_end:
+                left.append(node)
+            elif offset >= old_sync:
+                stack.append(node)
+                right = stack
+                break
+            elif node.production >= 0:
+                stack.extend(reversed(node.children))
+                continue
+            offset = node_end
+
+        new_leaves.reverse()
+        left.reverse()
+        return right + new_leaves + left, relexed
+
+
+class GSSNode:
+    """Nodo de la pila estructurada en grafo del análisis GLR: un estado en
+    una posición de la entrada. Sus aristas van a los nodos anteriores de la
+    pila, cada una con el nodo del bosque que cubre el tramo entre ambos."""
+    __slots__ = ('state', 'level', 'edges')
+
+    def __init__(self, state, level):
+        self.state = state
+        self.level = level
+        self.edges = {}     # nodo anterior -> nodo del bosque
+
+
+class ParseForest:
+    """Bosque de análisis compartido y empaquetado (SPPF). Hay un nodo por
+    (símbolo, inicio, fin) y cada nodo guarda sus derivaciones alternativas
+    como (producción, hijos); un nodo con más de una alternativa es una
+    ambigüedad. Las posiciones son índices de token."""
+    def __init__(self, productions):
+        self.productions = productions
+        self.index = {}             # (símbolo, inicio, fin) -> id
+        self.nodes = []             # id -> (símbolo, inicio, fin)
+        self.alternatives = []      # id -> [(producción, ids de los hijos)]
+        self.root = None
+
+    def node(self, symbol, start, end):
+        key = (symbol, start, end)
+        node_id = self.index.get(key)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.index[key] = node_id
+            self.nodes.append(key)
+            self.alternatives.append([])
+        return node_id
+
+    def reachable(self):
+        """Ids de los nodos alcanzables desde la raíz, en preorden"""
+        if self.root is None:
+            return []
+        order = []
+        seen = {self.root}
+        stack = [self.root]
+        while stack:
+            node_id = stack.pop()
+            order.append(node_id)
+            for _, children in reversed(self.alternatives[node_id]):
+                for child in reversed(children):
+                    if child not in seen:
+                        seen.add(child)
+                        stack.append(child)
+        return order
+
+    def tree(self):
+        """Un árbol de derivación (mismo formato que parse) tomado del bosque.
+        Cada nodo usa la primera alternativa que queda derivada por completo,
+        así que los ciclos (A -> A, cadenas de ε) nunca se recorren."""
+        reachable = self.reachable()
+        if not reachable:
+            return None
+        
+        # Nodos derivables de abajo arriba, empezando por las hojas
+        chosen = {}
+        remaining = {}
+        users = {}
+        ready = []
+        for node_id in reachable:
+            if not self.alternatives[node_id]:
+                ready.append(node_id)
+            for index, (_, children) in enumerate(self.alternatives[node_id]):
+                distinct = set(children)
+                remaining[(node_id, index)] = len(distinct)
+                for child in distinct:
+                    users.setdefault(child, []).append((node_id, index))
+        derived = set(ready)
+        while ready:
+            for node_id, index in users.get(ready.pop(), ()):
+                remaining[(node_id, index)] -= 1
+                if not remaining[(node_id, index)] and node_id not in derived:
+                    derived.add(node_id)
+                    chosen[node_id] = index
+                    ready.append(node_id)
+        
+        built = {}
+        stack = [self.root]
+        while stack:
+            node_id = stack[-1]
+            if node_id in built:
+                stack.pop()
+                continue
+            children = (self.alternatives[node_id][chosen[node_id]][1]
+                        if node_id in chosen else ())
+            missing = [child for child in children if child not in built]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            built[node_id] = {"symbol": self.nodes[node_id][0],
+                              "children": [built[child] for child in children]}
+        return built[self.root]
+
+    def ambiguities(self):
+        """Nodos alcanzables con más de una derivación"""
+        result = []
+        for node_id in self.reachable():
+            alternatives = self.alternatives[node_id]
+            if len(alternatives) > 1:
+                symbol, start, end = self.nodes[node_id]
+                result.append({
+                    "symbol": symbol,
+                    "start": start,
+                    "end": end,
+                    "derivations": [{
+                        "production": prod_id + 1,
+                        "children": [list(self.nodes[child]) for child in children]
+                    } for prod_id, children in alternatives]
+                })
+        return result
+
+    def to_dict(self):
+        """Bosque alcanzable desde la raíz con ids consecutivos"""
+        reachable = self.reachable()
+        ids = {node_id: i for i, node_id in enumerate(reachable)}
+        return {
+            "root": 0 if reachable else None,
+            "nodes": [{
+                "id": ids[node_id],
+                "symbol": self.nodes[node_id][0],
+                "start": self.nodes[node_id][1],
+                "end": self.nodes[node_id][2],
+                "alternatives": [{
+                    "production": prod_id + 1,
+                    "children": [ids[child] for child in children]
+                } for prod_id, children in self.alternatives[node_id]]
+            } for node_id in reachable]
+        }
+
+
+class SyntaxNode:
+    """Nodo del árbol que guarda un análisis para reanalizarlo tras una edición.
+
+    Las hojas son tokens (production = -1) y width cuenta sus caracteres junto
+    con el espacio en blanco que los precede; un nodo interno mide la suma de
+    sus hijos, así que no guarda posiciones absolutas y un subárbol sirve tal
+    cual aunque la edición desplace el texto. state es el estado bajo el nodo
+    cuando se redujo y lookahead el tipo del token que lo seguía: el autómata
+    solo mira la cima de la pila y el token siguiente, así que desde el mismo
+    estado, con los mismos tokens y el mismo siguiente, volvería a construir
+    este mismo subárbol."""
+    __slots__ = ('symbol', 'production', 'children', 'state', 'lookahead',
+                 'first', 'width', 'tokens')
+
+    def __init__(self, symbol, production, children, state, lookahead, first, width, tokens):
+        self.symbol = symbol
+        self.production = production
+        self.children = children
+        self.state = state
+        self.lookahead = lookahead
+        self.first = first          # tipo del primer token (None si no cubre ninguno)
+        self.width = width
+        self.tokens = tokens        # número de tokens que cubre
+
+    @classmethod
+    def leaf(cls, token_type, width):
+        return cls(token_type, -1, (), -1, None, token_type, width, 1)
+
+
+class ParsedDocument:
+    """Una versión analizada de la entrada, base del siguiente análisis
+    incremental. forest cubre todos los tokens en orden: la raíz si la cadena
+    se aceptó y, si no, los subárboles de la pila al detectar el error
+    seguidos de lo que quedaba por analizar. Es inmutable: el análisis de la
+    versión siguiente comparte sus subárboles sin modificarlos."""
+    def __init__(self, tables, text, token_patterns, forest, accepted, error_position, stats):
+        self.input_id = uuid.uuid4().hex
+        self.tables = tables
+        self.text = text
+        self.token_patterns = token_patterns
+        self.forest = forest
+        self.width = sum(node.width for node in forest)     # final del último token
+        self.accepted = accepted
+        self.error_position = error_position
+        self.stats = stats
+
+    def tree(self):
+        """Árbol de derivación en el formato de recognize (None si no se aceptó)"""
+        if not self.accepted:
+            return None
+        root = self.forest[0]
+        tree = {"symbol": root.symbol, "children": []}
+        stack = [(root, tree)]
+        while stack:
+            node, output = stack.pop()
+            children = output["children"]
+            if node.production >= 0 and not node.children:
+                children.append({"symbol": "ε", "children": []})
+            for child in node.children:
+                child_output = {"symbol": child.symbol, "children": []}
+                children.append(child_output)
+                stack.append((child, child_output))
+        return self.tables.original_tree(tree)
+
+
+def common_affixes(old, new):
+    """Longitudes del prefijo y del sufijo comunes de dos textos, sin
+    solaparse. Busca por bisección comparando trozos (en C), así que cuesta
+    O(n) comparaciones de caracteres y O(log n) pasos en Python."""
+    limit = min(len(old), len(new))
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if new.startswith(old[low:middle], low):
+            low = middle
+        else:
+            high = middle - 1
+    prefix = low
+
+    old_end, new_end = len(old), len(new)
+    low, high = 0, limit - prefix
+    while low < high:
+        middle = (low + high + 1) // 2
+        if new.endswith(old[old_end - middle:old_end - low], 0, new_end - low):
+            low = middle
+        else:
+            high = middle - 1
+    return prefix, low
+
+def syntax_leaves(forest, limit=-1):
+    """Hojas de un bosque de SyntaxNode como (posición, hoja), en orden,
+    desde la primera que termina después de limit; los subárboles anteriores
+    se saltan enteros"""
+    stack = forest[::-1]
+    offset = 0
+    while stack:
+        node = stack.pop()
+        if offset + node.width <= limit:
+            offset += node.width
+        elif node.production < 0:
+            yield offset, node
+            offset += node.width
+        else:
+            stack.extend(reversed(node.children))
+
+
+def scc_union(nodes, edges, base):
+    """Resuelve value[n] = base[n] | OR(value[m] para m en edges[n]) sobre
+    bitsets. Usa Tarjan (iterativo): cada componente fuertemente conexa se
+    resuelve una sola vez, después de todas las componentes de las que depende."""
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    value = {}
+    counter = 0
+    
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(edges.get(root, ())))]
+        
+        while work:
+            node, successors = work[-1]
+            descended = False
+            for succ in successors:
+                if succ not in index:
+                    index[succ] = low[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack.add(succ)
+                    work.append((succ, iter(edges.get(succ, ()))))
+                    descended = True
+                    break
+                if succ in on_stack:
+                    low[node] = min(low[node], index[succ])
+            if descended:
+                continue
+            
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            
+            if low[node] == index[node]:
+                # Extraer la componente y resolverla de una vez
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                bits = 0
+                for member in component:
+                    bits |= base.get(member, 0)
+                    for succ in edges.get(member, ()):
+                        bits |= value.get(succ, 0)
+                for member in component:
+                    value[member] = bits
+    
+    return value
+
 
 class LR1Parser:
-    def __init__(self, grammar):
+    def __init__(self, grammar, mode='lr1', progress=None, base=None, limits=None):
+        if mode not in PARSER_MODES:
+            raise ValueError(f"Modo de construcción desconocido: {mode}")
         self.grammar = grammar
+        self.mode = mode
         self.first_sets = {}
-        self.states = []
+        self.follow_sets = {}
+        self.kernels = []               # cada estado se guarda por su kernel
+        self.states = LazyStates(self)  # clausuras calculadas bajo demanda
+        self.state_index = {}           # kernel del estado -> id
+        self.productions_by_lhs = {}    # lhs -> lista de (prod_id, rhs)
+        self.augmented_prod = None      # número de la producción aumentada
+        self._closure_cache = {}        # kernel -> clausura (memoizada)
+        self._item_pool = {}            # (prod_id, punto, bitset de lookaheads) -> Item
         self.goto_table = {}
         self.action_table = {}
         self.augmented_start = None
         self.base_start = None
+        self._progress = progress       # callback(phase=..., states=..., queue=...)
+        self._base = base               # parser de la versión anterior de la gramática
+        self._reused_rows = {}          # estado -> estado de la base con la misma fila
+        self._phase = None              # fase de construcción en curso y su inicio
+        self._phase_start = 0.0
+        self.build_seconds = {}         # fase -> segundos
+        self.closure_calls = 0          # clausuras calculadas
+        self.closure_cache_hits = 0     # clausuras servidas desde la memoización
+        self.closure_items = 0          # ítems de las clausuras calculadas
+        self._limits = limits           # BuildLimits o None
+        self._deadline = None
+        self.size_estimate = None       # estimación previa (solo con límites)
+        self._built = False             # con True las clausuras ya no se memoizan
         self.build_parser()
     
     def compute_first_sets(self):
-        """Calcula los conjuntos FIRST para todos los símbolos"""
-        # Inicializar FIRST sets
+        """Calcula los conjuntos FIRST para todos los símbolos.
+        Se calculan sobre bitsets de terminales: primero los no terminales
+        anulables y luego FIRST por componentes fuertemente conexas del grafo
+        A -> B (B puede iniciar A), sin pasadas repetidas sobre la gramática."""
+        self.bit_terminals = sorted(self.grammar.terminals) + ['$']
+        self.terminal_bits = {t: 1 << i for i, t in enumerate(self.bit_terminals)}
+        self._decoded_bits = {}
+        self.compute_nullable()
+        
+        base = {}
+        edges = {}
+        for lhs, rhs in self.grammar.productions:
+            bits = base.get(lhs, 0)
+            for symbol in rhs:
+                if symbol == 'ε':
+                    continue
+                if symbol in self.terminal_bits:
+                    bits |= self.terminal_bits[symbol]
+                    break
+                edges.setdefault(lhs, set()).add(symbol)
+                if symbol not in self.nullable:
+                    break
+            base[lhs] = bits
+        
+        self.first_bits = scc_union(self.grammar.non_terminals, edges, base)
+        
         for terminal in self.grammar.terminals:
             self.first_sets[terminal] = {terminal}
-        
         for non_terminal in self.grammar.non_terminals:
-            self.first_sets[non_terminal] = set()
-          # Iterativo hasta que no haya cambios
-        changed = True
-        while changed:
-            changed = False
-            for lhs, rhs in self.grammar.productions:
-                old_size = len(self.first_sets[lhs])
-                
-                if not rhs or rhs == ['ε']:  # Producción vacía
-                    self.first_sets[lhs].add('ε')
+            first = set(self.decode_bits(self.first_bits.get(non_terminal, 0)))
+            if non_terminal in self.nullable:
+                first.add('ε')
+            self.first_sets[non_terminal] = first
+
+    def compute_nullable(self):
+        """Calcula los no terminales que derivan ε con una lista de trabajo:
+        cada producción cuenta los símbolos de su lado derecho que aún no se
+        sabe que sean anulables y, al llegar a cero, su lado izquierdo lo es"""
+        self.nullable = set()
+        pending = []
+        uses = {}
+        work = []
+        for index, (lhs, rhs) in enumerate(self.grammar.productions):
+            symbols = [symbol for symbol in rhs if symbol != 'ε']
+            pending.append(len(symbols))
+            for symbol in symbols:
+                uses.setdefault(symbol, []).append(index)
+            if not symbols:
+                work.append(lhs)
+        while work:
+            symbol = work.pop()
+            if symbol in self.nullable:
+                continue
+            self.nullable.add(symbol)
+            for index in uses.get(symbol, ()):
+                pending[index] -= 1
+                if not pending[index]:
+                    work.append(self.grammar.productions[index][0])
+
+    def decode_bits(self, bits, memoize=True):
+        """Terminales de un bitset (tupla memoizada por valor)"""
+        terminals = self._decoded_bits.get(bits)
+        if terminals is None:
+            terminals = []
+            rest = bits
+            while rest:
+                low = rest & -rest
+                terminals.append(self.bit_terminals[low.bit_length() - 1])
+                rest ^= low
+            terminals = tuple(terminals)
+            if memoize:
+                self._decoded_bits[bits] = terminals
+        return terminals
+
+    def compute_suffix_first(self):
+        """Precalcula FIRST de cada sufijo rhs[pos:] de cada producción como
+        (bitset, anulable), para que la clausura solo tenga que consultarlo"""
+        self.suffix_first = {}
+        productions = list(enumerate(self.grammar.productions))
+        if self.augmented_prod == -1:
+            productions.append((-1, (self.augmented_start, [self.base_start])))
+        
+        for prod_id, (_, rhs) in productions:
+            suffixes = [(0, True)] * (len(rhs) + 1)
+            bits, nullable = 0, True
+            for pos in range(len(rhs) - 1, -1, -1):
+                symbol = rhs[pos]
+                if symbol == 'ε':
+                    pass
+                elif symbol in self.terminal_bits:
+                    bits, nullable = self.terminal_bits[symbol], False
                 else:
-                    for symbol in rhs:
-                        self.first_sets[lhs].update(self.first_sets[symbol] - {'ε'})
-                        if 'ε' not in self.first_sets[symbol]:
-                            break
+                    symbol_bits = self.first_bits.get(symbol, 0)
+                    if symbol in self.nullable:
+                        bits |= symbol_bits
                     else:
-                        # Todos los símbolos derivan ε
-                        self.first_sets[lhs].add('ε')
-                
-                if len(self.first_sets[lhs]) != old_size:
-                    changed = True
-    
+                        bits, nullable = symbol_bits, False
+                suffixes[pos] = (bits, nullable)
+            self.suffix_first[prod_id] = suffixes
+
+    def compute_follow_sets(self):
+        """Calcula los conjuntos FOLLOW de los no terminales (modo SLR)"""
+        follow_bits = self.compute_follow_bits()
+        self.follow_sets = {nt: set(self.decode_bits(follow_bits.get(nt, 0)))
+                            for nt in self.grammar.non_terminals}
+
+    def compute_follow_bits(self):
+        """FOLLOW de cada no terminal como bitset, por componentes fuertemente
+        conexas del grafo B -> A (FOLLOW(A) está incluido en FOLLOW(B))"""
+        base = {self.augmented_start: self.terminal_bits['$']}
+        edges = {}
+        for prod_id, (lhs, rhs) in enumerate(self.grammar.productions):
+            for i, symbol in enumerate(rhs):
+                if symbol not in self.grammar.non_terminals:
+                    continue
+                bits, nullable = self.suffix_first[prod_id][i + 1]
+                base[symbol] = base.get(symbol, 0) | bits
+                if nullable:
+                    edges.setdefault(symbol, set()).add(lhs)
+        
+        return scc_union(self.grammar.non_terminals, edges, base)
+
     def compute_first_table(self):
         """Tabla FIRST por no terminal (no por producción)."""
         self.first_table = []
@@ -111,66 +1821,245 @@ class LR1Parser:
                 "first": first_of_nt
             })
 
-    def first_of_string(self, symbols):
-        """Calcula FIRST de una secuencia de símbolos"""
-        if not symbols:
-            return {'ε'}
-        
-        result = set()
-        for symbol in symbols:
-            first_symbol = self.first_sets.get(symbol, {symbol})
-            result.update(first_symbol - {'ε'})
-            if 'ε' not in first_symbol:
-                break
-        else:
-            result.add('ε')
-        
-        return result
-    
-    def closure(self, items):
-        """Calcula la clausura de un conjunto de ítems"""
-        closure_set = set(items)
+    def index_productions(self):
+        """Agrupa las producciones por su lado izquierdo"""
+        self.productions_by_lhs = {}
+        seen = set()
+        for prod_id, (lhs, rhs) in enumerate(self.grammar.productions):
+            # Las producciones repetidas se reducen siempre por la primera
+            if (lhs, tuple(rhs)) in seen:
+                continue
+            seen.add((lhs, tuple(rhs)))
+            self.productions_by_lhs.setdefault(lhs, []).append((prod_id, rhs))
+
+    def make_item(self, prod_id, dot_pos, lookahead_bits, pool=None):
+        """Devuelve el ítem interno (una sola instancia por ítem distinto en
+        el depósito, por defecto el de la construcción)"""
+        memoize = pool is None
+        if memoize:
+            pool = self._item_pool
+        key = (prod_id, dot_pos, lookahead_bits)
+        item = pool.get(key)
+        if item is None:
+            lhs = self.grammar.productions[prod_id][0] if prod_id >= 0 else self.augmented_start
+            lookaheads = None if lookahead_bits is None else self.decode_bits(lookahead_bits, memoize)
+            item = Item(lhs, self.production_rhs[prod_id], dot_pos, lookaheads, prod_id, lookahead_bits)
+            pool[key] = item
+        return item
+
+    def encode_bits(self, terminals):
+        """Bitset de unos terminales, o None si alguno no es de esta gramática"""
+        bits = 0
+        for terminal in terminals:
+            bit = self.terminal_bits.get(terminal)
+            if bit is None:
+                return None
+            bits |= bit
+        return bits
+
+    def closure_lookaheads(self, seeds):
+        """Clausura sobre núcleos: recibe y devuelve {(prod_id, punto): bitset
+        de lookaheads} (None en LR(0)). Cada núcleo aparece una vez con la
+        unión de sus lookaheads y solo se vuelve a expandir si ese conjunto
+        crece, así que el trabajo no depende de cuántos terminales haya."""
+        closure = dict(seeds)
+        worklist = list(closure)
+        production_rhs = self.production_rhs
+        productions_by_lhs = self.productions_by_lhs
+        suffix_first = self.suffix_first
         
-        changed = True
-        while changed:
-            changed = False
-            new_items = set()
+        while worklist:
+            core = worklist.pop()
+            prod_id, dot_pos = core
+            rhs = production_rhs[prod_id]
+            if dot_pos >= len(rhs):
+                continue
+            productions = productions_by_lhs.get(rhs[dot_pos])
+            if not productions:
+                continue
             
-            for item in closure_set:
-                if item.dot_pos < len(item.rhs):
-                    next_symbol = item.rhs[item.dot_pos]
-                    if next_symbol in self.grammar.non_terminals:
-                        # Beta es lo que sigue después del símbolo
-                        beta = item.rhs[item.dot_pos + 1:] + [item.lookahead]
-                        first_beta = self.first_of_string(beta)
-                        
-                        for lhs, rhs in self.grammar.productions:
-                            if lhs == next_symbol:
-                                for lookahead in first_beta:
-                                    if lookahead != 'ε':
-                                        new_item = Item(lhs, rhs, 0, lookahead)
-                                        if new_item not in closure_set:
-                                            new_items.add(new_item)
-                                            changed = True
+            bits = closure[core]
+            if bits is None:
+                # Ítems LR(0): no se calculan lookaheads
+                for new_prod, _ in productions:
+                    new_core = (new_prod, 0)
+                    if new_core not in closure:
+                        closure[new_core] = None
+                        worklist.append(new_core)
+                continue
             
-            closure_set.update(new_items)
+            # FIRST(beta lookaheads), con beta lo que sigue al símbolo
+            first_bits, nullable = suffix_first[prod_id][dot_pos + 1]
+            if nullable:
+                first_bits |= bits
+            if not first_bits:
+                continue
+            for new_prod, _ in productions:
+                new_core = (new_prod, 0)
+                old = closure.get(new_core, 0)
+                if old | first_bits != old:
+                    closure[new_core] = old | first_bits
+                    worklist.append(new_core)
         
+        return closure
+
+    def closure(self, items):
+        """Calcula la clausura de un conjunto de ítems (un ítem por núcleo)"""
+        self.closure_calls += 1
+        seeds = {}
+        for item in items:
+            bits = item.lookahead_bits
+            seeds[item.core] = None if bits is None else seeds.get(item.core, 0) | bits
+        return {self.make_item(prod_id, dot_pos, bits)
+                for (prod_id, dot_pos), bits in self.closure_lookaheads(seeds).items()}
+
+    def closure_of(self, kernel):
+        """Clausura de un kernel, memoizada por kernel"""
+        closure_set = self._closure_cache.get(kernel)
+        if closure_set is None:
+            closure_set = frozenset(self.closure(kernel))
+            self._closure_cache[kernel] = closure_set
+            self.closure_items += len(closure_set)
+        else:
+            self.closure_cache_hits += 1
         return closure_set
 
-    def goto(self, items, symbol):
-        """Calcula GOTO(items, symbol)"""
-        goto_items = set()
-        
+    def state_closure(self, kernel, pool=None):
+        """Clausura de un estado para LazyStates: durante la construcción es
+        closure_of; después se calcula con un depósito de ítems local y no
+        deja nada memoizado en el parser"""
+        if not self._built:
+            return self.closure_of(kernel)
+        pool = {} if pool is None else pool
+        seeds = {}
+        for item in kernel:
+            bits = item.lookahead_bits
+            seeds[item.core] = None if bits is None else seeds.get(item.core, 0) | bits
+        return frozenset(self.make_item(prod_id, dot_pos, bits, pool)
+                         for (prod_id, dot_pos), bits in self.closure_lookaheads(seeds).items())
+
+    def successor_kernels(self, items):
+        """Kernels de GOTO(items, X) para todos los símbolos X en una sola
+        pasada: cada ítem avanzado va al grupo del símbolo tras el punto"""
+        buckets = {}
         for item in items:
-            if (item.dot_pos < len(item.rhs) and 
-                item.rhs[item.dot_pos] == symbol):
-                new_item = Item(item.lhs, item.rhs, item.dot_pos + 1, item.lookahead)
-                goto_items.add(new_item)
+            if item.dot_pos < len(item.rhs):
+                advanced = self.make_item(item.prod_id, item.dot_pos + 1, item.lookahead_bits)
+                bucket = buckets.get(item.rhs[item.dot_pos])
+                if bucket is None:
+                    buckets[item.rhs[item.dot_pos]] = [advanced]
+                else:
+                    bucket.append(advanced)
+        return buckets
+
+    @staticmethod
+    def state_key(kernel):
+        """Clave canónica y hashable de un estado (su kernel congelado)"""
+        return frozenset(kernel)
+
+    def report_progress(self, phase, queue=0):
+        """Informa del avance de la construcción al callback, si lo hay, y
+        mide el tiempo de cada fase (build_seconds)"""
+        if phase != self._phase:
+            now = perf_counter()
+            if self._phase is not None:
+                self.build_seconds[self._phase] = now - self._phase_start
+            self._phase, self._phase_start = phase, now
+        if self._progress is not None and phase is not None:
+            self._progress(phase=phase, states=len(self.kernels), queue=queue)
+
+    def check_limits(self, phase, states, items):
+        """Aborta la construcción con GrammarTooComplex si supera algún límite"""
+        limits = self._limits
+        if limits is None:
+            return
+        if limits.max_states and states > limits.max_states:
+            raise GrammarTooComplex('states', limits.max_states, states, phase, self.size_estimate)
+        if limits.max_items and items > limits.max_items:
+            raise GrammarTooComplex('items', limits.max_items, items, phase, self.size_estimate)
+        if self._deadline is not None and perf_counter() > self._deadline:
+            elapsed = round(perf_counter() - self._deadline + limits.time_limit, 3)
+            raise GrammarTooComplex('time', limits.time_limit, elapsed, phase, self.size_estimate)
+
+    def estimate_size(self):
+        """Estimación barata antes de construir: el autómata LR(0) sobre núcleos
+        (producción, punto), sin objetos Item, y el tamaño de los conjuntos de
+        lookahead acotado por FOLLOW. Cualquier modo tiene al menos esos
+        estados e ítems de clausura (salvo con no terminales improductivos,
+        que con lookaheads no generan ítems), así que si ya superan los
+        límites se aborta sin construir nada."""
+        rhs_of = self.production_rhs
+        lhs_of = {prod_id: lhs for prod_id, (lhs, _) in enumerate(self.grammar.productions)}
+        lhs_of[-1] = self.augmented_start
         
-        return self.closure(goto_items)
-    
+        # Producciones que añade a la clausura cada no terminal (por esquinas izquierdas)
+        expansions = {}
+        for non_terminal in self.productions_by_lhs:
+            seen = {non_terminal}
+            pending = [non_terminal]
+            cores = []
+            while pending:
+                for prod_id, rhs in self.productions_by_lhs[pending.pop()]:
+                    cores.append((prod_id, 0))
+                    if rhs[0] in self.productions_by_lhs and rhs[0] not in seen:
+                        seen.add(rhs[0])
+                        pending.append(rhs[0])
+            expansions[non_terminal] = cores
+        
+        follow_sizes = {lhs: bin(bits).count('1') for lhs, bits in self.compute_follow_bits().items()}
+        
+        initial = frozenset([(self.augmented_prod, 0)])
+        kernels = {initial}
+        pending = [initial]
+        items = 0
+        lookahead_items = 0
+        while pending:
+            closure = set(pending.pop())
+            for prod_id, dot in list(closure):
+                rhs = rhs_of[prod_id]
+                if dot < len(rhs) and rhs[dot] in expansions:
+                    closure.update(expansions[rhs[dot]])
+            items += len(closure)
+            
+            targets = {}
+            for prod_id, dot in closure:
+                lookahead_items += follow_sizes.get(lhs_of[prod_id], 0)
+                rhs = rhs_of[prod_id]
+                if dot < len(rhs):
+                    targets.setdefault(rhs[dot], []).append((prod_id, dot + 1))
+            for target in targets.values():
+                kernel = frozenset(target)
+                if kernel not in kernels:
+                    kernels.add(kernel)
+                    pending.append(kernel)
+            self.check_limits('estimate', len(kernels), items)
+        
+        return {
+            "lr0_states": len(kernels),
+            "lr0_items": items,
+            "lookahead_items": lookahead_items,
+            "max_lookahead": max(follow_sizes.values(), default=0),
+            "terminals": len(self.grammar.terminals) + 1,
+            "productions": len(self.grammar.productions)
+        }
+
+    def build_stats(self):
+        """Contadores de la construcción: segundos por fase, clausuras, ítems y estados"""
+        return {
+            "seconds": dict(self.build_seconds),
+            "closure_calls": self.closure_calls,
+            "closure_cache_hits": self.closure_cache_hits,
+            "items": self.items_created,
+            "closure_items": self.closure_items,
+            "states": len(self.kernels),
+            "incremental": self.incremental,
+        }
+
     def build_parser(self):
-        """Construye los estados y las tablas del parser LR(1)"""
+        """Construye los estados y las tablas del parser según el modo"""
+        if self._limits is not None and self._limits.time_limit:
+            self._deadline = perf_counter() + self._limits.time_limit
+        self.report_progress('first_sets')
         self.compute_first_sets()
         self.compute_first_table()
         
@@ -195,45 +2084,322 @@ class LR1Parser:
             self.grammar.productions.insert(0, (self.augmented_start, [self.base_start]))
             self.grammar.non_terminals.add(self.augmented_start)
         
+        self.index_productions()
+        self._closure_cache = {}
+        self._item_pool = {}
+        
+        self.augmented_prod = next(
+            (i for i, (lhs, rhs) in enumerate(self.grammar.productions)
+             if lhs == self.augmented_start and rhs == [self.base_start]), -1)
+        self.production_rhs = {prod_id: rhs for prod_id, (_, rhs) in enumerate(self.grammar.productions)}
+        self.production_rhs[-1] = [self.base_start]     # producción aumentada implícita
+        self.compute_suffix_first()
+        if self._limits is not None:
+            self.report_progress('estimate')
+            self.size_estimate = self.estimate_size()
+        if self.mode == 'slr1':
+            # FOLLOW solo depende de la gramática: se calcula antes de los
+            # estados para que la reconstrucción incremental sepa qué filas
+            # ACTION puede copiar de la base
+            self.report_progress('follow_sets')
+            self.compute_follow_sets()
+        if self._base is not None:
+            self.prepare_reuse(self._base)
+        if self.mode == 'lr1':
+            initial_item = self.make_item(self.augmented_prod, 0, self.terminal_bits['$'])
+        else:
+            # LALR y SLR parten del autómata LR(0)
+            initial_item = self.make_item(self.augmented_prod, 0, None)
+        self.build_states(initial_item)
+        
+        if self.mode == 'lalr1':
+            self.report_progress('lookaheads')
+            self.compute_lalr_lookaheads()
+        
+        # Construir las tablas ACTION y GOTO
+        self.report_progress('tables')
+        self.build_action_table()
+        self.report_progress('compile')
+        self.tables = CompiledTables(self)
+        if TABLE_COMPRESSION:
+            dense = CompiledTables(self) if COMPRESSION_VERIFY else None
+            self.tables.compress()
+            if dense is not None and not self.tables.covers(dense):
+                app.logger.error("Las tablas compactadas no cubren las densas; se usan las densas")
+                self.tables = dense
+        self.report_progress(None)
+        self.items_created = len(self._item_pool)
+        self.incremental = self._base is not None
+        self._limits = None
+        # Las clausuras se vuelven a expandir bajo demanda (LazyStates)
+        self._closure_cache.clear()
+        self._item_pool.clear()
+        self._decoded_bits.clear()
+        self._built = True
+        # El callback y la base no forman parte del parser guardado en caché
+        self._progress = None
+        self._base = None
+        self._reused_rows = {}
+        for name in ('_shifts', '_prod_to_base', '_prod_from_base', '_tainted', '_first_changed',
+                     '_follow_changed', '_follow_tainted', '_base_index', '_base_symbols'):
+            self.__dict__.pop(name, None)
+
+    # --- Reconstrucción incremental ---
+
+    @staticmethod
+    def kernel_signature(kernel, lr0):
+        """Kernel como (producción, punto, lookaheads); sin lookaheads en LR(0).
+        Los lookaheads van como tupla de terminales: los bits de cada parser
+        dependen de sus terminales."""
+        return frozenset((item.prod_id, item.dot_pos, None if lr0 else item.lookaheads)
+                         for item in kernel)
+
+    def prepare_reuse(self, base):
+        """Compara la gramática con la de `base` y marca qué estados de la base
+        pueden reutilizarse: aquellos cuya clausura no toca ningún no terminal
+        con producciones distintas ni (en LR(1)) ningún símbolo cuyo FIRST
+        haya cambiado. En SLR(1) la fila ACTION de un estado reutilizado solo
+        se copia si no cambió el FOLLOW de ninguno de sus ítems completos.
+        Sin base compatible se construye todo de cero.
+        En LALR(1) los kernels de la base ya no guardan el autómata LR(0) (y
+        la propagación de lookaheads es global), así que no se reutiliza."""
+        self._base = None
+        if (base.mode != self.mode or self.mode == 'lalr1' or
+                base.augmented_start != self.augmented_start or
+                base.base_start != self.base_start or
+                base.augmented_prod < 0 or self.augmented_prod < 0):
+            return
+        
+        # Correspondencia de producciones (la primera de cada repetida)
+        new_ids = {}
+        for lhs, productions in self.productions_by_lhs.items():
+            for prod_id, rhs in productions:
+                new_ids[(lhs, tuple(rhs))] = prod_id
+        self._prod_to_base = {}
+        self._prod_from_base = {}
+        for lhs, productions in base.productions_by_lhs.items():
+            for prod_id, rhs in productions:
+                new_id = new_ids.get((lhs, tuple(rhs)))
+                if new_id is not None:
+                    self._prod_to_base[new_id] = prod_id
+                    self._prod_from_base[prod_id] = new_id
+        
+        def production_set(parser, lhs):
+            return {tuple(rhs) for _, rhs in parser.productions_by_lhs.get(lhs, ())}
+        changed = {lhs for lhs in set(self.productions_by_lhs) | set(base.productions_by_lhs)
+                   if production_set(self, lhs) != production_set(base, lhs)}
+        
+        lr0 = self.mode != 'lr1'
+        if lr0:
+            first_changed = set()
+        else:
+            first_changed = {nt for nt in self.grammar.non_terminals | base.grammar.non_terminals
+                             if self.first_sets.get(nt) != base.first_sets.get(nt)}
+        
+        # Un no terminal está contaminado si su clausura (por esquinas
+        # izquierdas) llega a uno cambiado o a un FIRST distinto
+        left_corner_of = {}     # B -> no terminales A con A -> B ...
+        tainted = set(changed)
+        for lhs, productions in self.productions_by_lhs.items():
+            for _, rhs in productions:
+                if any(symbol in first_changed for symbol in rhs):
+                    tainted.add(lhs)
+                if rhs[0] in self.productions_by_lhs or rhs[0] in changed:
+                    left_corner_of.setdefault(rhs[0], set()).add(lhs)
+        worklist = list(tainted)
+        while worklist:
+            for lhs in left_corner_of.get(worklist.pop(), ()):
+                if lhs not in tainted:
+                    tainted.add(lhs)
+                    worklist.append(lhs)
+        
+        # SLR: los ítems completos de un estado son los del kernel y las
+        # producciones ε de los no terminales a los que llega su clausura, así
+        # que una fila no se copia si su kernel termina en un no terminal con
+        # FOLLOW distinto o tiene tras el punto uno que llega por esquinas
+        # izquierdas a una producción ε con FOLLOW distinto
+        follow_changed = {nt for nt in self.grammar.non_terminals | base.grammar.non_terminals
+                          if self.follow_sets.get(nt) != base.follow_sets.get(nt)}
+        follow_tainted = {lhs for lhs in follow_changed
+                          if any(rhs == ['ε'] for _, rhs in self.productions_by_lhs.get(lhs, ()))}
+        worklist = list(follow_tainted)
+        while worklist:
+            for lhs in left_corner_of.get(worklist.pop(), ()):
+                if lhs not in follow_tainted:
+                    follow_tainted.add(lhs)
+                    worklist.append(lhs)
+        
+        self._tainted = tainted
+        self._first_changed = first_changed
+        self._follow_changed = follow_changed
+        self._follow_tainted = follow_tainted
+        self._base_index = {self.kernel_signature(kernel, lr0): state_id
+                            for state_id, kernel in enumerate(base.kernels)}
+        self._base_symbols = {}     # estado de la base -> símbolos con transición
+        for source, symbol in sorted(base.goto_table):
+            self._base_symbols.setdefault(source, []).append(symbol)
+        self._base = base
+
+    def reused_transitions(self, state_id):
+        """Transiciones del estado copiadas de la base, o None si el estado
+        cambió y hay que calcular su clausura"""
+        lr0 = self.mode != 'lr1'
+        base_kernel = set()
+        reuse_row = True
+        for item in self.kernels[state_id]:
+            base_prod = self._prod_to_base.get(item.prod_id)
+            if base_prod is None:
+                return None
+            if item.dot_pos < len(item.rhs) and item.rhs != ['ε']:
+                if item.rhs[item.dot_pos] in self._tainted:
+                    return None
+                if any(symbol in self._first_changed for symbol in item.rhs[item.dot_pos + 1:]):
+                    return None
+                if item.rhs[item.dot_pos] in self._follow_tainted:
+                    reuse_row = False
+            elif item.lhs in self._follow_changed:
+                reuse_row = False
+            base_kernel.add((base_prod, item.dot_pos, item.lookaheads))
+        
+        base_state = self._base_index.get(frozenset(base_kernel))
+        if base_state is None:
+            return None
+        
+        transitions = []
+        for symbol in self._base_symbols.get(base_state, ()):
+            target = self._base.kernels[self._base.goto_table[(base_state, symbol)]]
+            goto_kernel = set()
+            for item in target:
+                bits = None if lr0 else self.encode_bits(item.lookaheads)
+                if not lr0 and not bits:
+                    return None
+                goto_kernel.add(self.make_item(self._prod_from_base[item.prod_id], item.dot_pos, bits))
+            transitions.append((symbol, frozenset(goto_kernel)))
+        if reuse_row:
+            self._reused_rows[state_id] = base_state
+        return transitions
+
+    def reused_action_row(self, state_id):
+        """Fila ACTION de un estado reutilizado, con los números de estado y de
+        producción de esta construcción"""
+        def translate(action, symbol):
+            action_type, value = action
+            if action_type == 'shift':
+                return ('shift', self.goto_table[(state_id, symbol)])
+            if action_type == 'reduce':
+                return ('reduce', self._prod_from_base[value])
+            if action_type == 'conflict':
+                return ('conflict', sorted((translate(a, symbol) for a in value),
+                                           key=self.conflict_order))
+            return action
+        
+        base_row = self._base.action_table[self._reused_rows[state_id]]
+        return {symbol: translate(action, symbol) for symbol, action in base_row.items()}
+
+    def build_states(self, initial_item):
+        """Construye la colección de estados (kernels) y las transiciones.
+        Las transiciones con terminales se guardan también en _shifts, para
+        que build_action_table no tenga que buscarlas en goto_table."""
         # Estado inicial
-        initial_item = Item(self.augmented_start, [self.base_start], 0, '$')
-        initial_state = self.closure({initial_item})
+        initial_kernel = self.state_key({initial_item})
         
-        self.states = [initial_state]
-        unmarked = [0]
+        self.kernels = [initial_kernel]
+        self.state_index = {initial_kernel: 0}
+        self._shifts = {}               # estado -> [(terminal, estado destino)]
+        terminals = self.grammar.terminals
+        unmarked = deque([0])
         
         # Construir todos los estados
         while unmarked:
-            state_id = unmarked.pop(0)
-            current_state = self.states[state_id]
+            state_id = unmarked.popleft()
+            if state_id % 64 == 0:
+                self.report_progress('states', queue=len(unmarked))
+            self.check_limits('states', len(self.kernels), self.closure_items)
             
-            # Encontrar todos los símbolos que pueden seguir al punto
-            symbols = set()
-            for item in current_state:
-                if item.dot_pos < len(item.rhs):
-                    symbols.add(item.rhs[item.dot_pos])
+            transitions = self.reused_transitions(state_id) if self._base else None
+            if transitions is None:
+                # Los kernels sucesores de todos los símbolos en una pasada
+                successors = self.successor_kernels(self.closure_of(self.kernels[state_id]))
+                
+                # Símbolos en orden: la numeración de estados es reproducible
+                transitions = [(symbol, successors[symbol]) for symbol in sorted(successors)]
             
-            # Para cada símbolo, calcular GOTO
-            for symbol in symbols:
-                goto_state = self.goto(current_state, symbol)
-                if goto_state:
-                    # Buscar si este estado ya existe
-                    existing_state_id = None
-                    for i, state in enumerate(self.states):
-                        if state == goto_state:
-                            existing_state_id = i
-                            break
+            # Para cada símbolo, registrar GOTO (y el desplazamiento si es terminal)
+            shifts = []
+            for symbol, goto_kernel in transitions:
+                if goto_kernel:
+                    # Buscar si este estado ya existe (búsqueda O(1) por kernel)
+                    key = self.state_key(goto_kernel)
+                    target = self.state_index.get(key)
                     
-                    if existing_state_id is None:
-                        # Nuevo estado
-                        new_state_id = len(self.states)
-                        self.states.append(goto_state)
-                        unmarked.append(new_state_id)
-                        self.goto_table[(state_id, symbol)] = new_state_id
-                    else:
-                        self.goto_table[(state_id, symbol)] = existing_state_id
-          # Construir las tablas ACTION y GOTO
-        self.build_action_table()
+                    if target is None:
+                        # Nuevo estado: se guarda solo el kernel
+                        target = len(self.kernels)
+                        self.kernels.append(key)
+                        self.state_index[key] = target
+                        unmarked.append(target)
+                    self.goto_table[(state_id, symbol)] = target
+                    if symbol in terminals:
+                        shifts.append((symbol, target))
+            self._shifts[state_id] = shifts
+
+    def compute_lalr_lookaheads(self):
+        """Calcula los lookaheads LALR(1) sobre los kernels LR(0) mediante
+        lookaheads espontáneos y propagación (algoritmo del libro del dragón).
+        Los conjuntos son bitsets; el bit siguiente al último terminal hace de
+        lookahead ficticio para descubrir qué lookaheads se propagan."""
+        probe = 1 << len(self.bit_terminals)
+        lookaheads = [{item.core: 0 for item in kernel} for kernel in self.kernels]
+        propagation = {}    # (estado, núcleo) -> [(estado destino, núcleo destino)]
+        
+        initial_core = (self.augmented_prod, 0)
+        lookaheads[0][initial_core] = self.terminal_bits['$']
+        
+        for state_id, kernel in enumerate(self.kernels):
+            self.check_limits('lookaheads', len(self.kernels), self.closure_items)
+            for kernel_item in kernel:
+                closure = self.closure_lookaheads({kernel_item.core: probe})
+                for (prod_id, dot_pos), bits in closure.items():
+                    rhs = self.production_rhs[prod_id]
+                    if dot_pos >= len(rhs):
+                        continue
+                    target = self.goto_table[(state_id, rhs[dot_pos])]
+                    target_core = (prod_id, dot_pos + 1)
+                    if bits & probe:
+                        propagation.setdefault((state_id, kernel_item.core), []).append(
+                            (target, target_core))
+                    lookaheads[target][target_core] |= bits & ~probe
+        
+        # Propagar hasta que no haya cambios
+        changed = True
+        while changed:
+            changed = False
+            for (state_id, core), targets in propagation.items():
+                source = lookaheads[state_id][core]
+                for target, target_core in targets:
+                    dest = lookaheads[target]
+                    if dest[target_core] | source != dest[target_core]:
+                        dest[target_core] |= source
+                        changed = True
+        
+        # Reemplazar los kernels LR(0) por kernels con lookaheads (los núcleos
+        # sin ningún lookahead no generan acciones y se descartan)
+        self.kernels = [
+            frozenset(self.make_item(prod_id, dot, bits)
+                      for (prod_id, dot), bits in state_lookaheads.items() if bits)
+            for state_lookaheads in lookaheads
+        ]
+        self.state_index = {kernel: i for i, kernel in enumerate(self.kernels)}
+        self._closure_cache = {}
+        
+        # Un ítem LR(0) sin ningún lookahead no aparece en la clausura con
+        # lookaheads: tampoco su desplazamiento
+        for state_id, shifts in self._shifts.items():
+            if shifts:
+                symbols = {item.rhs[item.dot_pos] for item in self.states[state_id]
+                           if item.dot_pos < len(item.rhs)}
+                self._shifts[state_id] = [(symbol, target) for symbol, target in shifts
+                                          if symbol in symbols]
     
     def get_augmented_grammar(self):
         """Genera la gramática aumentada mostrando todas las posiciones del punto"""
@@ -263,45 +2429,54 @@ class LR1Parser:
     
     def build_action_table(self):
         """Construye la tabla ACTION, detectando conflictos shift/reduce"""
-        for state_id, state in enumerate(self.states):
+        for state_id in range(len(self.kernels)):
+            self.check_limits('tables', len(self.kernels), self.closure_items)
+            if state_id in self._reused_rows:
+                self.action_table[state_id] = self.reused_action_row(state_id)
+                continue
             self.action_table[state_id] = {}
             
-            for item in state:
+            # SHIFT: las transiciones con terminales registradas al construir los estados
+            for symbol, next_state in self._shifts.get(state_id, ()):
+                self._add_action(state_id, symbol, 'shift', next_state)
+            
+            for item in self.states[state_id]:
                 # Para producciones epsilon (S -> ε), el ítem está completo inmediatamente
                 # porque no hay nada que desplazar después de ε
                 is_epsilon_production = (item.rhs == ['ε'])
                 is_complete = (item.dot_pos >= len(item.rhs)) or is_epsilon_production
                 
                 if is_complete:
-                    # REDUCE o ACCEPT
-                    if item.lhs == self.augmented_start and item.lookahead == '$':
-                        # ACCEPT
-                        self._add_action(state_id, '$', 'accept', None)
+                    # En modo SLR se reduce sobre FOLLOW(lhs)
+                    if item.lookaheads is None:
+                        lookaheads = sorted(self.follow_sets.get(item.lhs, ()))
                     else:
-                        # REDUCE - Encontrar el número de la producción
-                        prod_num = None
-                        for i, (lhs, rhs) in enumerate(self.grammar.productions):
-                            if lhs == item.lhs and rhs == item.rhs:
-                                prod_num = i
-                                break
-                        
-                        if prod_num is not None:
-                            self._add_action(state_id, item.lookahead, 'reduce', prod_num)
-                
-                elif item.dot_pos < len(item.rhs):
-                    # SHIFT (solo si no es epsilon y el símbolo es terminal)
-                    next_symbol = item.rhs[item.dot_pos]
-                    if next_symbol != 'ε' and next_symbol in self.grammar.terminals:
-                        if (state_id, next_symbol) in self.goto_table:
-                            next_state = self.goto_table[(state_id, next_symbol)]
-                            self._add_action(state_id, next_symbol, 'shift', next_state)
+                        lookaheads = item.lookaheads
+                    
+                    for lookahead in lookaheads:
+                        # REDUCE o ACCEPT
+                        if item.lhs == self.augmented_start and lookahead == '$':
+                            # ACCEPT
+                            self._add_action(state_id, '$', 'accept', None)
+                        else:
+                            # REDUCE - el ítem ya conoce su número de producción
+                            if item.prod_id >= 0:
+                                self._add_action(state_id, lookahead, 'reduce', item.prod_id)
+    @staticmethod
+    def conflict_order(action):
+        """Orden de las acciones de un conflicto: desplazar antes que reducir y
+        la producción anterior primero (la resolución por defecto de yacc)"""
+        action_type, value = action
+        return ({'shift': 0, 'accept': 1}.get(action_type, 2), value or 0)
+
     def _add_action(self, state_id, symbol, action_type, value):
         """Agrega una acción a la tabla, detectando conflictos REALES"""
         if symbol in self.action_table[state_id]:
             existing = self.action_table[state_id][symbol]
             
-            # Si es una tupla simple (acción, valor)
-            if isinstance(existing, tuple) and len(existing) == 2:
+            # Si es una tupla simple (acción, valor); un conflicto también es
+            # una tupla de dos elementos, así que se excluye aquí
+            if existing[0] != 'conflict':
                 existing_action, existing_value = existing
                 
                 # Si es exactamente la misma acción, ignorar (no es conflicto)
@@ -311,9 +2486,9 @@ class LR1Parser:
                 # Solo si son acciones diferentes, marcar conflicto
                 self.action_table[state_id][symbol] = (
                     'conflict',
-                    [existing, (action_type, value)]
+                    sorted([existing, (action_type, value)], key=self.conflict_order)
                 )
-            elif isinstance(existing, tuple) and existing[0] == 'conflict':
+            else:
                 # Ya es un conflicto, verificar si la nueva acción ya existe
                 conflict_actions = existing[1]
                 new_action = (action_type, value)
@@ -322,14 +2497,14 @@ class LR1Parser:
                 if new_action not in conflict_actions:
                     self.action_table[state_id][symbol] = (
                         'conflict',
-                        conflict_actions + [new_action]
+                        sorted(conflict_actions + [new_action], key=self.conflict_order)
                     )
         else:
             # No hay conflicto, agregar la acción normalmente
             self.action_table[state_id][symbol] = (action_type, value)
     
     def analyze_grammar_type(self):
-        """Analiza si la gramática es LR(1) y clasifica los conflictos"""
+        """Analiza si la tabla del modo usado tiene conflictos y los clasifica"""
         conflicts = []
         is_lr1 = True
         
@@ -378,187 +2553,1165 @@ class LR1Parser:
                         "actions": conflict_actions
                     })
         
+        label = PARSER_MODES[self.mode]
         return {
             "is_lr1": is_lr1,
+            "mode": self.mode,
             "conflicts": conflicts,
-            "grammar_type": "LR(1)" if is_lr1 else "No es LR(1)"
+            "grammar_type": label if is_lr1 else f"No es {label}"
         }
-    def to_dot(self):
-        """Genera un grafo DOT simplificado del AFD LR(1)"""
+    def serialize_states(self, start=0, end=None):
+        """Colección canónica (o un rango de ella) como texto"""
+        end = len(self.states) if end is None else min(end, len(self.states))
+        return [{"id": i, "items": [str(item) for item in self.states[i]]}
+                for i in range(start, end)]
+
+    def serialize_action_table(self, start=0, end=None):
+        """Tabla ACTION en formato JSON (tuplas a listas)"""
+        end = len(self.states) if end is None else end
+        serialized_action_table = {}
+        for state_id, actions in self.action_table.items():
+            if not start <= state_id < end:
+                continue
+            serialized_action_table[state_id] = {}
+            for symbol, action in actions.items():
+                # Convertir tuplas a listas para JSON
+                if isinstance(action, tuple):
+                    serialized_action_table[state_id][symbol] = list(action)
+                    # Si hay una lista anidada de acciones (conflictos), convertirla también
+                    if action[0] == 'conflict' and isinstance(action[1], list):
+                        serialized_action_table[state_id][symbol][1] = [
+                            list(a) if isinstance(a, tuple) else a 
+                            for a in action[1]
+                        ]
+                else:
+                    serialized_action_table[state_id][symbol] = action
+        return serialized_action_table
+
+    def serialize_goto_table(self, start=0, end=None):
+        """Transiciones en formato JSON (claves "estado,símbolo")"""
+        end = len(self.states) if end is None else end
+        return {f"{state_id},{symbol}": target_state
+                for (state_id, symbol), target_state in self.goto_table.items()
+                if start <= state_id < end}
+
+    def to_dot(self, start=0, end=None):
+        """Genera un grafo DOT simplificado del AFD LR(1); con start/end solo
+        incluye ese rango de estados y sus transiciones salientes"""
+        end = len(self.states) if end is None else min(end, len(self.states))
         def esc(s: str) -> str:
             return s.replace('"', r'\"').replace('\n', '\\n')
 
-        lines = []
-        lines.append('digraph LR1 {')
-        lines.append('  rankdir=LR;')
-        lines.append('  node [shape=box, style="rounded,filled", fillcolor="#ffffff", fontsize=8, fontname="monospace"];')
-        lines.append('  edge [fontsize=8];')
-        lines.append('  graph [pad="0.5", nodesep="0.5", ranksep="1"];')
+        lines = []
+        lines.append('digraph LR1 {')
+        lines.append('  rankdir=LR;')
+        lines.append('  node [shape=box, style="rounded,filled", fillcolor="#ffffff", fontsize=8, fontname="monospace"];')
+        lines.append('  edge [fontsize=8];')
+        lines.append('  graph [pad="0.5", nodesep="0.5", ranksep="1"];')
+
+        # Mostrar TODOS los estados del rango con TODOS los ítems (sin truncar)
+        for i in range(start, end):
+            items_list = list(self.states[i])
+            
+            # Mostrar TODOS los ítems sin limitación
+            items_txt = "\\n".join(esc(str(item)) for item in items_list)
+            
+            label = f'I{i}\\n{items_txt}'
+            lines.append(f'  I{i} [label="{label}"];')
+
+        # Aristas
+        for (sid, symbol), tid in self.goto_table.items():
+            if start <= sid < end:
+                lines.append(f'  I{sid} -> I{tid} [label="{esc(symbol)}"];')
+
+        lines.append('}')
+        return "\n".join(lines)
+    
+    def parse(self, input_string, token_patterns=None, trace='full',
+              max_steps=None, time_limit=None):
+        """Analiza una cadena usando el parser LR(1) (ver CompiledTables.parse)"""
+        return self.tables.parse(input_string, token_patterns, trace, max_steps, time_limit)
+
+    def glr_parse(self, input_string, token_patterns=None, max_steps=None, time_limit=None):
+        """Analiza una cadena con GLR (ver CompiledTables.glr_recognize)"""
+        return self.tables.glr_parse(input_string, token_patterns, max_steps, time_limit)
+
+# --- Métricas ---
+
+class Metrics:
+    """Contadores e histogramas del proceso, expuestos en el formato de texto
+    de Prometheus por GET /metrics (cada worker de gunicorn tiene los suyos).
+    Un hilo puede además pedir el desglose de tiempos de su petición con
+    start_breakdown/stop_breakdown: record_phase lo va rellenando."""
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}     # (nombre, etiquetas) -> valor
+        self._histograms = {}   # (nombre, etiquetas) -> [cuentas por cubeta, suma, total]
+        self._help = {}         # nombre -> (tipo, descripción)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def describe(self, name, kind, description):
+        self._help[name] = (kind, description)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for k, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][k] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def record_phase(self, phase, seconds):
+        """Tiempo de una fase: al histograma y al desglose del hilo, si lo pidió"""
+        self.observe('lr1_phase_seconds', seconds, phase=phase)
+        breakdown = getattr(self._local, 'breakdown', None)
+        if breakdown is not None:
+            breakdown[phase] = breakdown.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, phase):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(phase, perf_counter() - start)
+
+    def start_breakdown(self):
+        self._local.breakdown = {}
+
+    def breakdown(self):
+        """Copia del desglose en curso (fase -> segundos), o None"""
+        breakdown = getattr(self._local, 'breakdown', None)
+        return dict(breakdown) if breakdown is not None else None
+
+    def stop_breakdown(self):
+        breakdown = self.breakdown()
+        self._local.breakdown = None
+        return breakdown
+
+    def count_parse(self, steps, tokens):
+        """Un análisis terminado (aceptado, rechazado o sin presupuesto)"""
+        with self._lock:
+            for name, value in (('lr1_parses_total', 1), ('lr1_parse_steps_total', steps),
+                                ('lr1_parse_tokens_total', tokens)):
+                key = (name, ())
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    def record_build(self, parser):
+        """Fases y contadores de un parser recién construido"""
+        stats = parser.build_stats()
+        for phase, seconds in stats["seconds"].items():
+            self.record_phase(phase, seconds)
+        self.inc('lr1_builds_total', mode=parser.mode,
+                 kind='incremental' if stats["incremental"] else 'full')
+        self.inc('lr1_closure_calls_total', stats["closure_calls"])
+        self.inc('lr1_closure_cache_hits_total', stats["closure_cache_hits"])
+        self.inc('lr1_items_created_total', stats["items"])
+        self.inc('lr1_states_built_total', stats["states"])
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+    def render(self, samples=()):
+        """Texto para Prometheus; samples son valores leídos en el momento:
+        (nombre, tipo, descripción, valor)"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(entry[0]), entry[1], entry[2])
+                          for key, entry in self._histograms.items()}
+        
+        series = {}
+        for (name, labels), value in counters.items():
+            series.setdefault(name, []).append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        
+        output = []
+        for name in sorted(series):
+            kind, description = self._help.get(name, ('untyped', ''))
+            output += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            output += sorted(series[name]) if kind != 'histogram' else series[name]
+        for name, kind, description, value in samples:
+            output += [f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        return '\n'.join(output) + '\n'
+
+
+metrics = Metrics()
+for _name, _kind, _description in (
+        ('lr1_phase_seconds', 'histogram', "Duración de cada fase (construcción, análisis y respuesta)"),
+        ('lr1_http_request_seconds', 'histogram', "Duración de las peticiones HTTP por endpoint"),
+        ('lr1_http_requests_total', 'counter', "Peticiones HTTP por endpoint, método y código"),
+        ('lr1_builds_total', 'counter', "Parsers construidos por modo y tipo (completa o incremental)"),
+        ('lr1_builds_rejected_total', 'counter', "Construcciones abortadas por límite y fase"),
+        ('lr1_closure_calls_total', 'counter', "Clausuras calculadas durante las construcciones"),
+        ('lr1_closure_cache_hits_total', 'counter', "Clausuras servidas desde la memoización"),
+        ('lr1_items_created_total', 'counter', "Ítems distintos creados durante las construcciones"),
+        ('lr1_states_built_total', 'counter', "Estados de los parsers construidos"),
+        ('lr1_parses_total', 'counter', "Análisis ejecutados"),
+        ('lr1_parse_steps_total', 'counter', "Pasos (desplazamientos y reducciones) de los análisis"),
+        ('lr1_parse_tokens_total', 'counter', "Tokens consumidos por los análisis"),
+        ('lr1_parse_reused_tokens_total', 'counter', "Tokens cubiertos por subárboles reutilizados en análisis incrementales")):
+    metrics.describe(_name, _kind, _description)
+
+# --- Caché de gramáticas compiladas ---
+
+def code_version():
+    """Hash corto del código de este módulo. Los parsers guardados en disco
+    son objetos de esta versión del código: otra versión no debe leerlos."""
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class ParserCache:
+    """Caché LRU de parsers ya construidos, acotada por número de entradas y
+    por bytes, segura entre hilos. Si se configura un directorio, los parsers
+    también se guardan en disco para compartirlos entre workers de gunicorn.
+    Los tamaños se miden una vez al guardar: los parsers cacheados no cambian
+    después (LazyStates no memoiza en ellos). En disco se guardan como mucho
+    disk_max_bytes y se borran los archivos sin usar en disk_max_age segundos
+    y los de otras versiones del código."""
+    STALE_SECONDS = 3600    # antigüedad a partir de la que se borran los archivos ajenos
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024, directory=None,
+                 disk_max_bytes=1024 ** 3, disk_max_age=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_max_age = disk_max_age
+        self._entries = OrderedDict()   # clave -> (parser, tamaño en bytes)
+        self._building = {}             # clave -> (cerrojo, hilos que lo usan)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        # En disco la clave lleva la versión del código, así que los pickles
+        # de otra versión de app.py no se leen nunca
+        self.version = code_version()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.prune_disk()
+
+    @staticmethod
+    def grammar_key(grammar, mode, normalize='none'):
+        """Hash de la lista normalizada de producciones, del modo y, si se
+        pidió, del nivel de normalización de la gramática"""
+        productions = [[lhs, rhs] for lhs, rhs in grammar.productions]
+        key = [mode, productions] if normalize == 'none' else [mode, normalize, productions]
+        normalized = json.dumps(key, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}-{self.version}.pickle")
+
+    def get(self, key, count_miss=True):
+        """Devuelve el parser guardado o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        
+        # Segundo nivel: parsers construidos por otros procesos
+        path = self._path(key) if self.directory else None
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                parser = pickle.loads(data)
+            except Exception:
+                # Archivo truncado o que no corresponde a este código: es un
+                # fallo de caché y el archivo se descarta
+                parser = None
+                self._remove(path)
+            if parser is not None:
+                try:
+                    os.utime(path)      # la antigüedad cuenta desde el último uso
+                except OSError:
+                    pass
+                self._store(key, parser, len(data))
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return parser
+        
+        if count_miss:
+            with self._lock:
+                self.misses += 1
+        return None
+
+    @contextmanager
+    def building(self, key):
+        """Cerrojo por clave: cada parser se construye una sola vez aunque lo
+        pidan varias peticiones a la vez; las demás esperan y lo encuentran
+        en la caché"""
+        with self._lock:
+            lock, users = self._building.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self._building[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._building[key]
+                if users == 1:
+                    del self._building[key]
+                else:
+                    self._building[key] = (lock, users - 1)
+
+    def put(self, key, parser):
+        """Guarda un parser construido (en memoria y, si aplica, en disco)"""
+        data = pickle.dumps(parser, protocol=pickle.HIGHEST_PROTOCOL)
+        if self.directory:
+            # Escritura atómica para que otros workers nunca lean un archivo a medias
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self.prune_disk()
+        self._store(key, parser, len(data))
+
+    def prune_disk(self):
+        """Borra del directorio los parsers sin usar en disk_max_age segundos
+        y, si aún ocupan más de disk_max_bytes, los usados hace más tiempo.
+        Los archivos de otras versiones del código y los temporales que dejó
+        una escritura interrumpida se borran cuando llevan STALE_SECONDS sin
+        tocarse (hasta entonces pueden ser de otro worker en pleno despliegue)."""
+        now = time.time()
+        suffix = f"-{self.version}.pickle"
+        files = []
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                info = entry.stat()
+            except OSError:
+                continue
+            age = now - info.st_mtime
+            if entry.name.endswith(suffix):
+                expired = age > self.disk_max_age
+            else:
+                expired = entry.name.endswith(('.pickle', '.tmp')) and age > self.STALE_SECONDS
+            if expired:
+                self._remove(entry.path)
+            elif entry.name.endswith(suffix):
+                files.append((info.st_mtime, info.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _store(self, key, parser, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (parser, size)
+            self.total_bytes += size
+            # Expulsar las entradas menos usadas recientemente
+            while (len(self._entries) > self.max_entries or
+                   self.total_bytes > self.max_bytes):
+                _, (_, old_size) = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "shared_directory": self.directory
+            }
+
+
+parser_cache = ParserCache(
+    max_entries=int(os.environ.get('PARSER_CACHE_SIZE', 32)),
+    max_bytes=int(os.environ.get('PARSER_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    directory=os.environ.get('PARSER_CACHE_DIR') or None,
+    disk_max_bytes=int(os.environ.get('PARSER_CACHE_DISK_BYTES', 1024 ** 3)),
+    disk_max_age=int(os.environ.get('PARSER_CACHE_DISK_AGE', 7 * 24 * 3600))
+)
+
+
+class DocumentCache:
+    """Últimos análisis incrementales (ParsedDocument) por input_id, solo en
+    memoria: el cliente manda el input_id de la versión anterior de la
+    entrada como base_input_id para que se reanalice solo lo editado"""
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, input_id):
+        with self._lock:
+            document = self._entries.get(input_id)
+            if document is not None:
+                self._entries.move_to_end(input_id)
+            return document
+
+    def put(self, document):
+        with self._lock:
+            self._entries[document.input_id] = document
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
 
-        # Mostrar TODOS los estados con TODOS los ítems (sin truncar)
-        for i, state in enumerate(self.states):
-            items_list = list(state)
-            
-            # Mostrar TODOS los ítems sin limitación
-            items_txt = "\\n".join(esc(str(item)) for item in items_list)
-            
-            label = f'I{i}\\n{items_txt}'
-            lines.append(f'  I{i} [label="{label}"];')
+document_cache = DocumentCache(int(os.environ.get('INPUT_CACHE_SIZE', 64)))
 
-        # Aristas
-        for (sid, symbol), tid in self.goto_table.items():
-            lines.append(f'  I{sid} -> I{tid} [label="{esc(symbol)}"];')
+def get_parser(grammar_text, mode='lr1', base_id=None, limits=BUILD_LIMITS, normalize='none'):
+    """Devuelve el parser de la gramática, construyéndolo solo si no está en caché.
+    Con base_id (el grammar_id de una versión anterior de la gramática) se
+    reutilizan los estados que la edición no afecta. Con normalize distinto
+    de 'none' se construye sobre la gramática normalizada (ver
+    normalize_grammar). La construcción lanza GrammarTooComplex si supera
+    los límites (limits=None: sin límites)."""
+    with metrics.timer('parse_grammar'):
+        grammar = parse_grammar(grammar_text)
+    key = ParserCache.grammar_key(grammar, mode, normalize)
+    parser = parser_cache.get(key)
+    if parser is not None:
+        return parser
+    with parser_cache.building(key):
+        # Otra petición pudo construirlo mientras se esperaba el cerrojo
+        parser = parser_cache.get(key, count_miss=False)
+        if parser is not None:
+            return parser
+        if normalize != 'none':
+            with metrics.timer('normalize'):
+                grammar = normalize_grammar(grammar, normalize)
+        base = parser_cache.get(base_id) if base_id and re.fullmatch(r'[0-9a-f]{64}', base_id) else None
+        parser = LR1Parser(grammar, mode=mode, base=base, limits=limits)
+        metrics.record_build(parser)
+        if base is not None and INCREMENTAL_VERIFY:
+            full_grammar = parse_grammar(grammar_text)
+            if normalize != 'none':
+                full_grammar = normalize_grammar(full_grammar, normalize)
+            full = LR1Parser(full_grammar, mode=mode, limits=limits)
+            if not parser.tables.same_as(full.tables):
+                app.logger.error("La reconstrucción incremental de %s no coincide con la completa", key)
+                parser = full
+        parser.grammar_id = key     # para pedir estados y tablas después
+        parser_cache.put(key, parser)
+    return parser
 
-        lines.append('}')
-        return "\n".join(lines)
-    
-    def parse(self, input_string):
-        """Analiza una cadena usando el parser LR(1)"""
-        # Para gramáticas simples como S -> ( S ) S, usar tokenización directa
-        tokens = []
-        
-        for char in input_string:
-            if char.isspace():
-                continue
-            elif char in '()':
-                tokens.append(char)
+# --- Artefactos de tablas en disco ---
+
+_loaded_artifacts = {}      # id de artefacto -> CompiledTables mapeadas
+_artifacts_lock = threading.Lock()
+
+def artifact_path(artifact_id):
+    if not re.fullmatch(r'[0-9a-f]{64}', artifact_id or ''):
+        raise ValueError(f"Identificador de artefacto inválido: {artifact_id}")
+    return os.path.join(ARTIFACT_DIR, f"{artifact_id}.lr1t")
+
+def export_artifact(grammar_text, mode='lr1', path=None, limits=BUILD_LIMITS, normalize='none'):
+    """Construye (o toma de la caché) el parser y exporta sus tablas.
+    El id del artefacto es el hash de la gramática normalizada y el modo."""
+    parser = get_parser(grammar_text, mode, limits=limits, normalize=normalize)
+    artifact_id = parser.grammar_id
+    if path is None:
+        os.makedirs(ARTIFACT_DIR, exist_ok=True)
+        path = artifact_path(artifact_id)
+    parser.tables.export(path)
+    return artifact_id, path
+
+def load_artifact(artifact_id):
+    """Devuelve las tablas de un artefacto, mapeándolas solo la primera vez"""
+    with _artifacts_lock:
+        tables = _loaded_artifacts.get(artifact_id)
+        if tables is None:
+            path = artifact_path(artifact_id)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No existe el artefacto {artifact_id}")
+            tables = CompiledTables.load(path)
+            _loaded_artifacts[artifact_id] = tables
+        return tables
+
+# --- Generación de módulos Python independientes ---
+
+# Driver del módulo generado: las tablas son tuplas planas y la columna extra
+# de cada fila (token desconocido) siempre es error, así que el bucle no
+# consulta diccionarios ni comprueba conflictos en cada paso
+PARSER_MODULE_DRIVER = '''
+class ParseBudgetExceeded(Exception):
+    """El análisis superó el máximo de pasos"""
+
+
+_TERMINAL_IDS = {terminal: i for i, terminal in enumerate(TERMINALS)}
+_UNKNOWN = len(TERMINALS)
+
+
+@lru_cache(maxsize=16)
+def _lexer(token_patterns):
+    return Lexer(TERMINALS, dict(token_patterns))
+
+def tokenize(input_string, token_patterns=None):
+    """Genera los tokens de la entrada (sin el $ final)"""
+    return _lexer(tuple(sorted((token_patterns or {}).items()))).tokens(input_string)
+
+
+def _original_tree(tree):
+    """Vuelve a poner en el árbol los nodos de las cadenas unitarias que se
+    sustituyeron al normalizar la gramática"""
+    if not UNIT_CHAINS or tree is None:
+        return tree
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        children = node["children"]
+        if not children:
+            continue
+        unit_chain = UNIT_CHAINS.get((node["symbol"], tuple(child["symbol"] for child in children)))
+        if unit_chain:
+            wrapped = children
+            for symbol in reversed(unit_chain):
+                wrapped = [{"symbol": symbol, "children": wrapped}]
+            node["children"] = wrapped
+        stack.extend(children)
+    return tree
+
+
+def recognize(types, build_tree=False, max_steps=MAX_STEPS):
+    """Analiza una lista de tipos de token terminada en '$'.
+    Devuelve (aceptada, índice del token con error, árbol)."""
+    ids = [_TERMINAL_IDS.get(token, _UNKNOWN) for token in types]
+    if build_tree:
+        return _recognize_tree(types, ids, max_steps)
+    action = ACTION
+    goto = GOTO
+    action_rows = ACTION_ROWS
+    goto_rows = GOTO_ROWS
+    prod_lhs = PROD_LHS
+    prod_len = PROD_LEN
+    stack = [0]
+    i = 0
+    token_id = ids[0]
+    for _ in range(max_steps):
+        code = action[action_rows[stack[-1]] + token_id]
+        if code > 0:
+            if code == ACCEPT:
+                return True, None, None
+            stack.append(code - 1)
+            i += 1
+            token_id = ids[i]
+        elif code:
+            value = -code - 1
+            length = prod_len[value]
+            if length:
+                del stack[-length:]
+            target = goto[goto_rows[stack[-1]] + prod_lhs[value]]
+            if target < 0:
+                return False, i, None
+            stack.append(target)
+        else:
+            return False, i, None
+    raise ParseBudgetExceeded(f"Se superó el máximo de {max_steps} pasos")
+
+def _recognize_tree(types, ids, max_steps):
+    action = ACTION
+    goto = GOTO
+    action_rows = ACTION_ROWS
+    goto_rows = GOTO_ROWS
+    prod_lhs = PROD_LHS
+    prod_len = PROD_LEN
+    non_terminals = NON_TERMINALS
+    stack = [0]
+    trees = []
+    i = 0
+    token_id = ids[0]
+    for _ in range(max_steps):
+        code = action[action_rows[stack[-1]] + token_id]
+        if code > 0:
+            if code == ACCEPT:
+                return True, None, _original_tree(trees[-1] if trees else None)
+            stack.append(code - 1)
+            trees.append({"symbol": types[i], "children": []})
+            i += 1
+            token_id = ids[i]
+        elif code:
+            value = -code - 1
+            length = prod_len[value]
+            if length:
+                del stack[-length:]
+                children = trees[-length:]
+                del trees[-length:]
             else:
-                # Para otros casos, usar el tokenizador completo
-                # Resetear y usar el tokenizador original
-                tokens = []
-                i = 0
-                keywords = {'var', 'int', 'float', 'bool', 'if', 'else', 'while', 'for', 'true', 'false'}
-                
-                while i < len(input_string):
-                    ch = input_string[i]
-                    
-                    if ch.isspace():
-                        i += 1
-                        continue
-                    elif ch in '(){}=;,:+-*/':
-                        tokens.append(ch)
-                        i += 1
-                    elif ch.isdigit():
-                        num = ''
-                        while i < len(input_string) and (input_string[i].isdigit() or input_string[i] == '.'):
-                            num += input_string[i]
-                            i += 1
-                        tokens.append('num')
-                    elif ch.isalpha() or ch == '_':
-                        identifier = ''
-                        while i < len(input_string) and (input_string[i].isalnum() or input_string[i] == '_'):
-                            identifier += input_string[i]
-                            i += 1
-                        
-                        if identifier in keywords:
-                            tokens.append(identifier)
-                        else:
-                            tokens.append('id')
-                    else:
-                        i += 1
-                break
-        
-        tokens.append('$')
+                children = [{"symbol": "ε", "children": []}]
+            lhs = prod_lhs[value]
+            trees.append({"symbol": non_terminals[lhs], "children": children})
+            target = goto[goto_rows[stack[-1]] + lhs]
+            if target < 0:
+                return False, i, None
+            stack.append(target)
+        else:
+            return False, i, None
+    raise ParseBudgetExceeded(f"Se superó el máximo de {max_steps} pasos")
+
+
+def trace_steps(types, max_steps=MAX_STEPS):
+    """Analiza registrando cada paso (pila de símbolos, entrada restante y
+    acción). Devuelve (aceptada, pasos, árbol)."""
+    ids = [_TERMINAL_IDS.get(token, _UNKNOWN) for token in types]
+    stack = [0]
+    symbols = []
+    trees = []
+    steps = []
+    i = 0
+    while i < len(types):
+        if len(steps) >= max_steps:
+            raise ParseBudgetExceeded(f"Se superó el máximo de {max_steps} pasos")
+        token = types[i]
+        code = ACTION[ACTION_ROWS[stack[-1]] + ids[i]]
+        if code < 0 and (DEFAULT_CELLS.get(stack[-1], 0) >> ids[i]) & 1:
+            code = 0        # reducción por defecto: error en la tabla densa
+        step = len(steps) + 1
+        if code == 0:
+            steps.append({"step": step, "stack": ' '.join(symbols) if symbols else '0',
+                          "input": ' '.join(types[i:]), "action": "ERROR"})
+            return False, steps, None
+        if code == ACCEPT:
+            steps.append({"step": step, "stack": ' '.join(symbols) if symbols else '0',
+                          "input": '$', "action": "acc"})
+            return True, steps, _original_tree(trees[-1] if trees else None)
+        if code > 0:
+            stack.append(code - 1)
+            symbols.append(token)
+            trees.append({"symbol": token, "children": []})
+            steps.append({"step": step, "stack": ' '.join(symbols),
+                          "input": ' '.join(types[i:]), "action": f"s{code - 1}"})
+            i += 1
+        else:
+            value = -code - 1
+            lhs = NON_TERMINALS[PROD_LHS[value]]
+            length = PROD_LEN[value]
+            if length:
+                del symbols[-length:]
+                del stack[-length:]
+                children = trees[-length:]
+                del trees[-length:]
+            else:
+                children = [{"symbol": "ε", "children": []}]
+            trees.append({"symbol": lhs, "children": children})
+            symbols.append(lhs)
+            target = GOTO[GOTO_ROWS[stack[-1] if stack else 0] + PROD_LHS[value]]
+            if target >= 0:
+                stack.append(target)
+            steps.append({"step": step, "stack": ' '.join(symbols),
+                          "input": ' '.join(types[i:]), "action": f"r{value + 1}"})
+    return False, steps, None
+
+
+def parse(input_string, token_patterns=None, trace='full', max_steps=MAX_STEPS):
+    """Tokeniza la cadena y la analiza.
+    trace: 'none' (solo aceptar/rechazar), 'tree' (árbol sin pasos) o
+    'full' (pasos y árbol). Devuelve (aceptada, pasos, árbol)."""
+    if trace not in ('none', 'tree', 'full'):
+        raise ValueError(f"Nivel de traza desconocido: {trace}")
+    types = [token.type for token in tokenize(input_string, token_patterns)]
+    types.append('$')
+    if trace == 'full':
+        return trace_steps(types, max_steps)
+    accepted, _, tree = recognize(types, trace == 'tree', max_steps)
+    return accepted, [], tree
+'''
+
+def _literal_tuple(values, width=100):
+    """Literal de tupla repartido en líneas de como mucho `width` caracteres"""
+    items = [repr(value) for value in values]
+    if not items:
+        return '()'
+    lines = []
+    line = ''
+    for item in items:
+        if line and len(line) + len(item) + 2 > width:
+            lines.append(line)
+            line = ''
+        line += item + ', '
+    lines.append(line)
+    return '(\n' + '\n'.join('    ' + line.rstrip() for line in lines) + '\n)'
+
+def _literal_dict(mapping):
+    """Literal de diccionario con una entrada por línea"""
+    if not mapping:
+        return '{}'
+    return '{\n' + ''.join(f"    {key!r}: {value!r},\n" for key, value in mapping.items()) + '}'
+
+def generate_parser_module(tables, max_steps=PARSE_MAX_STEPS):
+    """Código fuente de un módulo Python independiente (sin Flask ni código de
+    construcción) que analiza con estas tablas; su parse() devuelve lo mismo
+    que LR1Parser.parse"""
+    n_terminals = tables.n_terminals
+    # Las filas de ACTION son bloques consecutivos de n_terminals celdas
+    action = []
+    for start in range(0, len(tables.action), n_terminals):
+        action.extend(tables.action[start:start + n_terminals])
+        action.append(0)    # columna de token desconocido
+    action_rows = [start // n_terminals * (n_terminals + 1) for start in tables.action_rows]
+    
+    parts = [
+        f'"""Parser {PARSER_MODES[tables.mode]} generado a partir de una gramática. No editar.\n\n'
+        'Uso: parse(texto, token_patterns=None, trace=\'full\') -> (aceptada, pasos, árbol)\n"""\n\n'
+        '# Producciones:\n' + '\n'.join(f"#   {i + 1}. {lhs} -> {' '.join(rhs)}"
+                                        for i, (lhs, rhs) in enumerate(tables.productions)),
+        'import re\nfrom collections import namedtuple\nfrom functools import lru_cache',
+        f"MODE = {tables.mode!r}\n"
+        f"TERMINALS = {_literal_tuple(tables.terminals)}\n"
+        f"NON_TERMINALS = {_literal_tuple(tables.non_terminals)}\n"
+        f"ACCEPT = {CompiledTables.ACCEPT}\n"
+        f"MAX_STEPS = {max_steps}\n\n"
+        "# ACTION[ACTION_ROWS[estado] + terminal]: 0 error, >0 desplazar al\n"
+        "# estado n - 1, <0 reducir por la producción -n - 1, ACCEPT aceptar\n"
+        f"ACTION = {_literal_tuple(action)}\n"
+        f"ACTION_ROWS = {_literal_tuple(action_rows)}\n"
+        "# GOTO[GOTO_ROWS[estado] + no terminal], definido solo donde hay transición\n"
+        f"GOTO = {_literal_tuple(tables.goto)}\n"
+        f"GOTO_ROWS = {_literal_tuple(tables.goto_rows)}\n"
+        f"PROD_LHS = {_literal_tuple(tables.prod_lhs)}\n"
+        f"PROD_LEN = {_literal_tuple(tables.prod_len)}\n"
+        "# estado -> bits de las columnas de ACTION con reducción por defecto\n"
+        f"DEFAULT_CELLS = {_literal_dict(tables.default_cells)}\n"
+        "# Cadenas unitarias sustituidas al normalizar: (lhs, rhs) -> intermedios\n"
+        f"UNIT_CHAINS = {_literal_dict(tables.unit_chains)}",
+        f"DEFAULT_TOKEN_PATTERNS = {DEFAULT_TOKEN_PATTERNS!r}\n\n"
+        "Token = namedtuple('Token', ['type', 'value', 'pos', 'line', 'column'])",
+        inspect.getsource(Lexer).rstrip(),
+        PARSER_MODULE_DRIVER.strip(),
+    ]
+    return '\n\n\n'.join(parts) + '\n'
+
+# --- Construcción de parsers en segundo plano ---
+
+def _build_worker(conn, grammar_text, mode, cpu_limit, memory_limit):
+    """Proceso hijo: construye el parser con límites de CPU y memoria y envía
+    por la tubería el progreso y el resultado"""
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 5))
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    
+    last_report = [0.0]
+    def progress(**info):
+        # Como mucho unos diez mensajes por segundo
+        now = perf_counter()
+        if info['phase'] != 'states' or now - last_report[0] >= 0.1:
+            last_report[0] = now
+            conn.send(('progress', info))
+    
+    # Los mensajes se envían fuera de los except: la traza de un MemoryError
+    # mantiene vivo el parser a medias y no dejaría memoria para enviarlos
+    out_of_memory = False
+    try:
+        result = ('done', LR1Parser(parse_grammar(grammar_text), mode=mode, progress=progress))
+    except MemoryError:
+        out_of_memory = True
+    except Exception as e:
+        result = ('error', str(e))
+    
+    if not out_of_memory:
+        try:
+            conn.send(result)
+        except MemoryError:
+            out_of_memory = True
+    result = None
+    if out_of_memory:
+        conn.send(('error', "Se superó el límite de memoria de la construcción."))
+    conn.close()
+
+
+class BuildJob:
+    """Estado de una construcción en segundo plano"""
+    FINISHED = ('done', 'failed', 'cancelled')
+
+    def __init__(self, grammar_text, mode, grammar_id):
+        self.job_id = uuid.uuid4().hex
+        self.grammar_text = grammar_text
+        self.mode = mode
+        self.grammar_id = grammar_id
+        self.status = 'queued'
+        self.progress = {}
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.process = None
+        self.version = 0                        # crece con cada cambio de estado
+        self.changed = threading.Condition()
+
+    def update(self, **fields):
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if fields.get('status') in self.FINISHED:
+                self.finished = time.time()
+            self.version += 1
+            self.changed.notify_all()
+
+    @property
+    def done(self):
+        return self.status in self.FINISHED
+
+    def to_dict(self):
+        with self.changed:
+            end = self.finished or time.time()
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "mode": self.mode,
+                "grammar_id": self.grammar_id,
+                "progress": dict(self.progress),
+                "error": self.error,
+                "elapsed": round(end - self.started, 3) if self.started else 0.0
+            }
+
+
+class BuildQueueFull(Exception):
+    """Hay demasiados trabajos de construcción en cola o en curso"""
+    def __init__(self, limit):
+        self.limit = limit
+        super().__init__(f"Hay {limit} construcciones en cola o en curso; inténtelo más tarde.")
+
+
+class BuildJobManager:
+    """Ejecuta construcciones caras en procesos separados y guarda el parser
+    resultante en parser_cache. Los trabajos esperan en una cola que atienden
+    max_workers hilos (uno por proceso de construcción), así que no se crea
+    un hilo por trabajo; con queue_limit trabajos en cola o en curso, submit
+    lanza BuildQueueFull. Los terminados se olvidan pasados ttl segundos o
+    cuando hay más de jobs_kept."""
+    def __init__(self, max_workers=2, cpu_limit=300, memory_limit=2 * 1024 ** 3, jobs_kept=1000,
+                 queue_limit=64, ttl=3600):
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.jobs_kept = jobs_kept
+        self.queue_limit = queue_limit
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.jobs = OrderedDict()       # job_id -> BuildJob
+        self._active = {}               # grammar_id -> BuildJob en cola o en curso
+        self._queue = SimpleQueue()
+        self._workers = []              # hilos que atienden la cola (se crean al primer trabajo)
+        self._lock = threading.Lock()
+        # spawn: el hijo no hereda los hilos ni los sockets del servidor
+        self._context = multiprocessing.get_context('spawn')
+
+    def submit(self, grammar_text, mode='lr1'):
+        """Encola la construcción (o reutiliza la ya encolada o cacheada)"""
+        grammar_id = ParserCache.grammar_key(parse_grammar(grammar_text), mode)
+        with self._lock:
+            job = self._active.get(grammar_id)
+            if job is not None:
+                return job
+            self._prune()
+            cached = parser_cache.get(grammar_id) is not None
+            if not cached and len(self._active) >= self.queue_limit:
+                raise BuildQueueFull(self.queue_limit)
+            job = BuildJob(grammar_text, mode, grammar_id)
+            self.jobs[job.job_id] = job
+            if cached:
+                job.update(status='done', started=job.created)
+                return job
+            self._active[grammar_id] = job
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._serve, daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with job.changed:
+            if not job.done:
+                job.update(status='cancelled')
+                if job.process is not None and job.process.is_alive():
+                    job.process.terminate()
+        # Un trabajo cancelado en cola deja de ocupar su plaza
+        self._release(job)
+        return job
+
+    def active_count(self):
+        """Trabajos en cola o en curso"""
+        with self._lock:
+            return len(self._active)
+
+    def _prune(self):
+        # Se olvidan los trabajos terminados hace más de ttl segundos y, si
+        # aun así sobran, los terminados más antiguos
+        expired = time.time() - self.ttl
+        excess = len(self.jobs) - self.jobs_kept
+        for job_id in list(self.jobs):
+            job = self.jobs[job_id]
+            if job.done and (excess > 0 or job.finished < expired):
+                del self.jobs[job_id]
+                excess -= 1
+
+    def _release(self, job):
+        with self._lock:
+            if self._active.get(job.grammar_id) is job:
+                del self._active[job.grammar_id]
+
+    def _serve(self):
+        # Hilo trabajador: construye los trabajos de la cola uno a uno
+        while True:
+            job = self._queue.get()
+            try:
+                self._build(job)
+            except Exception:
+                app.logger.exception("Error en el trabajo de construcción %s", job.job_id)
+                if not job.done:
+                    job.update(status='failed', error="Error interno de la construcción.")
+            finally:
+                self._release(job)
+
+    def _build(self, job):
+        receiver, sender = self._context.Pipe(duplex=False)
+        with job.changed:
+            if job.done:        # cancelado mientras esperaba turno
+                return
+            job.process = self._context.Process(
+                target=_build_worker, daemon=True,
+                args=(sender, job.grammar_text, job.mode, self.cpu_limit, self.memory_limit))
+            job.process.start()
+            job.update(status='running', started=time.time())
+        sender.close()
         
-        stack = [0]
-        symbol_stack = []
-        steps = []
-        parse_tree_stack = []
+        try:
+            while True:
+                try:
+                    kind, payload = receiver.recv()
+                except (EOFError, OSError):
+                    break
+                if kind == 'progress':
+                    job.update(progress=payload)
+                elif kind == 'done':
+                    metrics.record_build(payload)
+                    payload.grammar_id = job.grammar_id
+                    parser_cache.put(job.grammar_id, payload)
+                    job.update(status='done', progress={"phase": "done", "states": len(payload.kernels),
+                                                        "queue": 0})
+                elif kind == 'error':
+                    job.update(status='failed', error=payload)
+        finally:
+            receiver.close()
+            job.process.join()
         
-        i = 0
-        step_count = 0
-        while i < len(tokens) and step_count < 1000:  # Aumentar límite
-            step_count += 1
-            state = stack[-1]
-            token = tokens[i]
-            
-            if state not in self.action_table or token not in self.action_table[state]:
-                steps.append({
-                    "step": step_count,
-                    "stack": ' '.join(symbol_stack) if symbol_stack else '0',
-                    "input": ' '.join(tokens[i:]),
-                    "action": "ERROR"
-                })
-                return False, steps, None
-            
-            action_data = self.action_table[state][token]
-            
-            # Manejar conflictos (tomar la primera acción)
-            if isinstance(action_data, (list, tuple)) and len(action_data) > 0:
-                if action_data[0] == 'conflict':
-                    # Tomar la primera acción del conflicto
-                    action, value = action_data[1][0] if isinstance(action_data[1], list) else action_data
-                else:
-                    action, value = action_data[0], action_data[1] if len(action_data) > 1 else None
+        if not job.done:
+            # El proceso murió sin responder: lo mató un límite de recursos
+            exitcode = job.process.exitcode
+            if exitcode == -signal.SIGXCPU or exitcode == -signal.SIGKILL:
+                error = "Se superó el límite de CPU o de memoria de la construcción."
             else:
-                return False, steps, None
-            
-            if action == 'shift':
-                stack.append(value)
-                symbol_stack.append(token)
-                parse_tree_stack.append({
-                    "symbol": token,
-                    "children": []
-                })
-                steps.append({
-                    "step": step_count,
-                    "stack": ' '.join(symbol_stack) if symbol_stack else '0',
-                    "input": ' '.join(tokens[i:]),
-                    "action": f"s{value}"
-                })
-                i += 1
-                
-            elif action == 'reduce':
-                lhs, rhs = self.grammar.productions[value]
-                
-                # Para producciones epsilon, no hacer pop
-                if rhs != ['ε']:
-                    children = []
-                    for _ in range(len(rhs)):
-                        if symbol_stack:
-                            symbol_stack.pop()
-                        if stack:
-                            stack.pop()
-                        if parse_tree_stack:
-                            children.insert(0, parse_tree_stack.pop())
-                    
-                    parent_node = {
-                        "symbol": lhs,
-                        "children": children
-                    }
-                else:
-                    # Producción epsilon
-                    parent_node = {
-                        "symbol": lhs,
-                        "children": [{"symbol": "ε", "children": []}]
-                    }
-                
-                parse_tree_stack.append(parent_node)
-                symbol_stack.append(lhs)
-                
-                current_state = stack[-1] if stack else 0
-                if (current_state, lhs) in self.goto_table:
-                    stack.append(self.goto_table[(current_state, lhs)])
-                
-                steps.append({
-                    "step": step_count,
-                    "stack": ' '.join(symbol_stack) if symbol_stack else '0',
-                    "input": ' '.join(tokens[i:]),
-                    "action": f"r{value + 1}"
-                })
-                
-            elif action == 'accept':
-                steps.append({
-                    "step": step_count,
-                    "stack": ' '.join(symbol_stack) if symbol_stack else '0',
-                    "input": '$',
-                    "action": "acc"
-                })
-                
-                tree = parse_tree_stack[-1] if parse_tree_stack else None
-                return True, steps, tree
-        
-        return False, steps, None
+                error = f"La construcción terminó de forma inesperada (código {exitcode})."
+            job.update(status='failed', error=error)
+
+
+build_jobs = BuildJobManager(BUILD_WORKERS, BUILD_CPU_LIMIT, BUILD_MEMORY_LIMIT, BUILD_JOBS_KEPT,
+                             BUILD_QUEUE_LIMIT, BUILD_JOBS_TTL)
+
+# --- Análisis por lotes ---
+
+_batch_pool = None          # pool de procesos compartido por todas las peticiones
+_batch_pool_lock = threading.Lock()
+_batch_tables = {}          # en cada proceso del pool: clave -> tablas ya cargadas
+BATCH_TABLES_KEPT = 8
+
+def batch_pool():
+    """Pool de BATCH_WORKERS procesos, creado la primera vez que se usa.
+    Los procesos se crean con spawn: un fork desde el servidor con hilos
+    podría heredar cerrojos tomados por otros hilos."""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS,
+                                              mp_context=multiprocessing.get_context('spawn'))
+        return _batch_pool
+
+def discard_batch_pool(pool):
+    """Descarta el pool si un proceso murió (el pool queda inutilizable)"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _batch_chunk(args):
+    # Las tablas llegan serializadas con cada trozo; cada proceso las
+    # deserializa una sola vez por clave
+    key, data, inputs, include_tree, token_patterns, max_steps, time_limit = args
+    tables = _batch_tables.get(key)
+    if tables is None:
+        if len(_batch_tables) >= BATCH_TABLES_KEPT:
+            _batch_tables.clear()
+        tables = _batch_tables[key] = pickle.loads(data)
+    return [batch_result(tables, text, include_tree, token_patterns, max_steps, time_limit)
+            for text in inputs]
+
+def batch_result(tables, input_string, include_tree=False, token_patterns=None,
+                 max_steps=None, time_limit=None):
+    """Resultado compacto del análisis de una cadena"""
+    current = [None]    # último token leído por el parser
+    
+    def token_types():
+        for token in tables.tokenize(input_string, token_patterns):
+            current[0] = token
+            yield token.type
+        current[0] = None
+        yield '$'
+    
+    try:
+        accepted, error_position, tree = tables.recognize(
+            token_types(), build_tree=include_tree, max_steps=max_steps, time_limit=time_limit)
+    except ParseBudgetExceeded as e:
+        return {"accepted": False, "error_position": e.position, "budget_exceeded": e.to_dict()}
+    
+    result = {"accepted": accepted}
+    if not accepted:
+        # Posición del error en la cadena original
+        error_token = current[0]
+        result["error_position"] = error_position
+        if error_token is not None:
+            result["error_token"] = error_token.type
+            result["error_offset"] = error_token.pos
+            result["error_line"] = error_token.line
+            result["error_column"] = error_token.column
+        else:
+            result["error_token"] = '$'
+            result["error_offset"] = len(input_string)
+    if include_tree:
+        result["parse_tree"] = tree
+    return result
+
+def parse_batch(tables, inputs, include_tree=False, workers=None, token_patterns=None,
+                max_steps=None, time_limit=None):
+    """Analiza muchas cadenas con las mismas tablas. Los lotes grandes se
+    reparten por trozos en el pool de procesos compartido, con como mucho
+    `workers` trozos en curso a la vez."""
+    workers = min(workers or BATCH_WORKERS, BATCH_WORKERS)
+    if len(inputs) < BATCH_PROCESS_THRESHOLD or workers <= 1:
+        return [batch_result(tables, text, include_tree, token_patterns, max_steps, time_limit)
+                for text in inputs]
+    
+    data = pickle.dumps(tables, protocol=pickle.HIGHEST_PROTOCOL)
+    key = hashlib.sha256(data).hexdigest()
+    chunk_size = -(-len(inputs) // (workers * 4))
+    pool = batch_pool()
+    pending = deque()
+    results = []
+    try:
+        for i in range(0, len(inputs), chunk_size):
+            if len(pending) >= workers:
+                results.extend(pending.popleft().result())
+            pending.append(pool.submit(_batch_chunk, (key, data, inputs[i:i + chunk_size], include_tree,
+                                                      token_patterns, max_steps, time_limit)))
+        while pending:
+            results.extend(pending.popleft().result())
+    except BrokenProcessPool:
+        discard_batch_pool(pool)
+        raise
+    return results
+
+def read_batch_inputs():
+    """Lee las cadenas del cuerpo JSON ('inputs', una lista de cadenas) o de
+    un archivo NDJSON subido como 'file' (cada línea es una cadena JSON o
+    {"input": ...}). Lanza ValueError si alguna entrada no es una cadena."""
+    if 'file' in request.files:
+        inputs = []
+        for number, line in enumerate(request.files['file'].stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Archivo NDJSON inválido (línea {number}): {e}")
+            if isinstance(value, dict):
+                value = value.get('input')
+            if not isinstance(value, str):
+                raise ValueError(f"Archivo NDJSON inválido (línea {number}): la entrada debe ser una cadena.")
+            inputs.append(value)
+        return inputs, request.form
+    data = request.json
+    inputs = data.get('inputs', [])
+    if not isinstance(inputs, list) or not all(isinstance(text, str) for text in inputs):
+        raise ValueError("inputs debe ser una lista de cadenas.")
+    return inputs, data
+
+def compare_modes(grammar_text):
+    """Construye la gramática en todos los modos y compara el número de
+    estados y de conflictos respecto al LR(1) canónico"""
+    results = []
+    for mode in PARSER_MODES:
+        parser = get_parser(grammar_text, mode)
+        analysis = parser.analyze_grammar_type()
+        results.append({
+            "mode": mode,
+            "label": PARSER_MODES[mode],
+            "states": len(parser.states),
+            "conflicts": len(analysis["conflicts"])
+        })
+    
+    canonical_states = results[0]["states"]
+    for result in results:
+        result["state_reduction"] = canonical_states - result["states"]
+    return results
 
 def parse_grammar(grammar_text):
     """
@@ -656,6 +3809,117 @@ def tokenize_rhs(rhs_text):
     
     return rhs_symbols
 
+def normalize_grammar(grammar, level='clean'):
+    """Gramática equivalente más pequeña para construir el autómata.
+    'clean' quita las producciones repetidas y los símbolos inútiles (no
+    terminales improductivos o inalcanzables desde el inicial); 'units'
+    además sustituye cada cadena de producciones unitarias A -> B -> ... -> C
+    por las producciones de C cuando los intermedios no se usan en ninguna
+    otra parte. Si B aparece en otras producciones (E -> T en E -> E + T | T)
+    habría que copiar sus alternativas y el autómata crecería en vez de
+    encoger, así que esas cadenas se dejan como están. Los terminales se conservan aunque queden sin
+    uso, para que el lexer reconozca los mismos tokens, y los no terminales
+    terminados en ' no se tocan (LR1Parser los toma como inicial aumentado).
+    La nueva gramática guarda en unit_chains los no terminales intermedios de
+    cada producción que sustituye una cadena (para rehacer los árboles de la
+    gramática original, ver CompiledTables.original_tree) y en
+    normalization lo que se quitó."""
+    if level not in NORMALIZE_LEVELS:
+        raise ValueError(f"Nivel de normalización desconocido: {level}")
+    start = grammar.start_symbol
+    non_terminals = grammar.non_terminals
+    productions = list(dict.fromkeys((lhs, tuple(rhs)) for lhs, rhs in grammar.productions))
+    duplicates = len(grammar.productions) - len(productions)
+    
+    # Productivos: derivan alguna cadena de terminales
+    productive = set()
+    changed = True
+    while changed:
+        changed = False
+        for lhs, rhs in productions:
+            if lhs not in productive and all(s in productive or s not in non_terminals for s in rhs):
+                productive.add(lhs)
+                changed = True
+    # Si el inicial es improductivo el lenguaje es vacío: no se quita nada
+    empty_language = start not in productive
+    if empty_language:
+        productive = set(non_terminals)
+    productions = [(lhs, rhs) for lhs, rhs in productions
+                   if lhs in productive and all(s in productive or s not in non_terminals for s in rhs)]
+    productions = _reachable_productions(productions, start, non_terminals)
+    useful = {lhs for lhs, _ in productions}
+    
+    chains = {}
+    unit_productions = 0
+    if level == 'units' and not empty_language:
+        by_lhs = {}
+        uses = Counter()
+        for lhs, rhs in productions:
+            by_lhs.setdefault(lhs, []).append(rhs)
+            uses.update(symbol for symbol in rhs if symbol in non_terminals)
+        # Se sustituyen los no terminales con un único uso, que es la unitaria
+        inlined = {symbol for symbol in by_lhs
+                   if uses[symbol] == 1 and symbol != start and not symbol.endswith("'")}
+        collapsed = {}          # (lhs, rhs) -> cadena, en el orden de la gramática
+        for lhs, alternatives in by_lhs.items():
+            if lhs.endswith("'"):
+                for rhs in alternatives:
+                    collapsed.setdefault((lhs, rhs), ())
+                continue
+            # Recorrido en profundidad de las unitarias en el orden de las
+            # producciones; los ya visitados cortan los ciclos A -> B -> A
+            visited = {lhs}
+            pending = [((), iter(alternatives))]
+            while pending:
+                unit_chain, remaining = pending[-1]
+                rhs = next(remaining, None)
+                if rhs is None:
+                    pending.pop()
+                elif len(rhs) == 1 and rhs[0] in inlined:
+                    unit_productions += not unit_chain
+                    if rhs[0] not in visited:
+                        visited.add(rhs[0])
+                        pending.append((unit_chain + rhs, iter(by_lhs[rhs[0]])))
+                else:
+                    collapsed.setdefault((lhs, rhs), unit_chain)
+        productions = _reachable_productions(list(collapsed), start, non_terminals)
+        chains = {production: collapsed[production] for production in productions
+                  if collapsed[production]}
+    
+    normalized = Grammar()
+    for lhs, rhs in productions:
+        normalized.add_production(lhs, list(rhs))
+    normalized.finalize_symbols()
+    normalized.terminals |= grammar.terminals
+    normalized.unit_chains = chains
+    normalized.normalization = {
+        "level": level,
+        "productions": [len(grammar.productions), len(normalized.productions)],
+        "non_terminals": [len(non_terminals), len(normalized.non_terminals)],
+        "duplicates": duplicates,
+        "unproductive": sorted(non_terminals - productive),
+        "unreachable": sorted(productive - useful),
+        "unit_productions": unit_productions,
+        "inlined": sorted(useful - normalized.non_terminals),
+        "empty_language": empty_language,
+    }
+    return normalized
+
+def _reachable_productions(productions, start, non_terminals):
+    """Producciones cuyo lhs es alcanzable desde el símbolo inicial"""
+    by_lhs = {}
+    for lhs, rhs in productions:
+        by_lhs.setdefault(lhs, []).append(rhs)
+    reachable = {start}
+    pending = [start]
+    while pending:
+        for rhs in by_lhs.get(pending.pop(), ()):
+            for symbol in rhs:
+                if symbol in non_terminals and symbol not in reachable:
+                    reachable.add(symbol)
+                    pending.append(symbol)
+    return [(lhs, rhs) for lhs, rhs in productions if lhs in reachable]
+
 # --- Endpoints de la API ---
 
 @app.route('/')
@@ -673,26 +3937,573 @@ def test():
 def serve_static(filename):
     return send_from_directory('frontend', filename)
 
+# Estos ganchos se registran antes que la compresión, así que su
+# after_request se ejecuta después y mide también la compresión
+@app.before_request
+def start_request_metrics():
+    g.request_start = perf_counter()
+    if PROFILING_ENABLED and request.headers.get('X-Profile'):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:      # ya hay otro perfilador activo en el proceso
+            return
+        g.profiler = profiler
+
+@app.after_request
+def finish_request_metrics(response):
+    """Cuenta la petición, guarda su perfil si se pidió y, si la petición
+    recogió un desglose de tiempos, lo envía en la cabecera Server-Timing"""
+    profiler = stop_profiler()
+    if profiler is not None:
+        try:
+            response.headers['X-Profile-Id'] = save_profile(profiler)
+        except OSError as e:
+            app.logger.warning("No se pudo guardar el perfil: %s", e)
+    
+    elapsed = perf_counter() - g.get('request_start', perf_counter())
+    endpoint = request.endpoint or 'unknown'
+    metrics.inc('lr1_http_requests_total', endpoint=endpoint, method=request.method,
+                status=response.status_code)
+    metrics.observe('lr1_http_request_seconds', elapsed, endpoint=endpoint)
+    
+    breakdown = metrics.breakdown()
+    if breakdown is not None:
+        breakdown['total'] = elapsed
+        response.headers['Server-Timing'] = ', '.join(
+            f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in breakdown.items())
+    return response
+
+@app.teardown_request
+def reset_request_metrics(exception=None):
+    """Detiene el perfilador y descarta el desglose de tiempos aunque la
+    vista o un after_request hayan lanzado una excepción"""
+    stop_profiler()
+    metrics.stop_breakdown()
+
+def stop_profiler():
+    """Detiene y devuelve el perfilador de la petición, si sigue activo"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    return profiler
+
+def save_profile(profiler):
+    """Guarda el perfil en PROFILE_DIR (solo los PROFILES_KEPT más recientes) y devuelve su id"""
+    profile_id = uuid.uuid4().hex
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+    profiles = sorted((entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith('.prof')),
+                      key=lambda entry: entry.stat().st_mtime)
+    for entry in profiles[:-PROFILES_KEPT]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return profile_id
+
+@app.after_request
+def compress_response(response):
+    """Comprime las respuestas grandes con Brotli (si está instalado) o gzip"""
+    if (response.direct_passthrough or response.is_streamed or
+            response.status_code < 200 or 'Content-Encoding' in response.headers or
+            response.mimetype not in ('application/json', 'text/plain')):
+        return response
+    
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+    
+    if encoding == 'br':
+        response.set_data(brotli.compress(data))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def cached_grammar(grammar_id):
+    """Parser construido por /parse, o respuesta 404 si ya no está en caché"""
+    parser = parser_cache.get(grammar_id) if re.fullmatch(r'[0-9a-f]{64}', grammar_id) else None
+    if parser is None:
+        return None, (jsonify({"error": "Gramática no encontrada; vuelva a enviarla a /parse."}), 404)
+    return parser, None
+
+def state_range(parser):
+    """Rango de estados pedido con ?start=&count="""
+    start = max(request.args.get('start', 0, type=int), 0)
+    count = request.args.get('count', STATES_PAGE_SIZE, type=int)
+    count = min(max(count, 1), STATES_PAGE_MAX)
+    return start, min(start + count, len(parser.states))
+
+@app.route('/grammars/<grammar_id>/states')
+def grammar_states(grammar_id):
+    parser, error = cached_grammar(grammar_id)
+    if error:
+        return error
+    start, end = state_range(parser)
+    return jsonify({
+        "grammar_id": grammar_id,
+        "state_count": len(parser.states),
+        "start": start,
+        "end": end,
+        "canonical_collection": parser.serialize_states(start, end)
+    })
+
+@app.route('/grammars/<grammar_id>/tables')
+def grammar_tables(grammar_id):
+    parser, error = cached_grammar(grammar_id)
+    if error:
+        return error
+    start, end = state_range(parser)
+    return jsonify({
+        "grammar_id": grammar_id,
+        "state_count": len(parser.states),
+        "start": start,
+        "end": end,
+        "parsing_table_action": parser.serialize_action_table(start, end),
+        "parsing_table_goto": parser.serialize_goto_table(start, end)
+    })
+
+@app.route('/grammars/<grammar_id>/dot')
+def grammar_dot(grammar_id):
+    parser, error = cached_grammar(grammar_id)
+    if error:
+        return error
+    start, end = state_range(parser)
+    return jsonify({
+        "grammar_id": grammar_id,
+        "state_count": len(parser.states),
+        "start": start,
+        "end": end,
+        "lr1_dot": parser.to_dot(start, end)
+    })
+
+@app.route('/grammars/<grammar_id>/module')
+def grammar_module(grammar_id):
+    """Módulo Python independiente con el parser de la gramática"""
+    parser, error = cached_grammar(grammar_id)
+    if error:
+        return error
+    return Response(generate_parser_module(parser.tables), mimetype='text/x-python',
+                    headers={"Content-Disposition": f"attachment; filename=parser_{grammar_id[:12]}.py"})
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(parser_cache.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas del proceso en el formato de texto de Prometheus"""
+    stats = parser_cache.stats()
+    samples = [
+        ('lr1_parser_cache_entries', 'gauge', "Parsers en la caché en memoria", stats["entries"]),
+        ('lr1_parser_cache_bytes', 'gauge', "Bytes ocupados por la caché en memoria", stats["bytes"]),
+        ('lr1_parser_cache_hits_total', 'counter', "Aciertos de la caché de parsers", stats["hits"]),
+        ('lr1_parser_cache_disk_hits_total', 'counter', "Aciertos servidos desde el directorio compartido",
+         stats["disk_hits"]),
+        ('lr1_parser_cache_misses_total', 'counter', "Fallos de la caché de parsers", stats["misses"]),
+        ('lr1_build_jobs_active', 'gauge', "Construcciones en segundo plano en cola o en curso",
+         build_jobs.active_count()),
+    ]
+    return Response(metrics.render(samples), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Perfil guardado por X-Profile: el archivo de pstats o, con
+    ?format=text, las funciones más costosas por tiempo acumulado"""
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    if not re.fullmatch(r'[0-9a-f]{32}', profile_id) or not os.path.exists(path):
+        return jsonify({"error": "Perfil no encontrado."}), 404
+    if request.args.get('format') == 'text':
+        output = io.StringIO()
+        pstats.Stats(path, stream=output).sort_stats('cumulative').print_stats(
+            request.args.get('limit', 50, type=int))
+        return Response(output.getvalue(), mimetype='text/plain')
+    return send_from_directory(PROFILE_DIR, f"{profile_id}.prof", as_attachment=True)
+
+@app.route('/artifacts', methods=['POST'])
+def create_artifact():
+    data = request.json
+    grammar_text = data.get('grammar')
+    mode = data.get('mode', 'lr1')
+    normalize = data.get('normalize', 'none')
+
+    if not grammar_text:
+        return jsonify({"error": "La gramática no puede estar vacía."}), 400
+    if mode not in PARSER_MODES:
+        return jsonify({"error": f"Modo desconocido: {mode}. Use uno de: {', '.join(PARSER_MODES)}."}), 400
+    if normalize not in NORMALIZE_LEVELS:
+        return jsonify({"error": f"Nivel de normalización desconocido: {normalize}. Use uno de: {', '.join(NORMALIZE_LEVELS)}."}), 400
+
+    try:
+        artifact_id, path = export_artifact(grammar_text, mode, normalize=normalize)
+    except GrammarTooComplex as e:
+        return complexity_error_response(e)
+    return jsonify({
+        "artifact_id": artifact_id,
+        "mode": mode,
+        "bytes": os.path.getsize(path)
+    })
+
+@app.route('/jobs', methods=['POST'])
+def create_build_job():
+    """Encola la construcción de una gramática; responde con el id del trabajo"""
+    data = request.json
+    grammar_text = data.get('grammar')
+    mode = data.get('mode', 'lr1')
+
+    if not grammar_text:
+        return jsonify({"error": "La gramática no puede estar vacía."}), 400
+    if mode not in PARSER_MODES:
+        return jsonify({"error": f"Modo desconocido: {mode}. Use uno de: {', '.join(PARSER_MODES)}."}), 400
+
+    try:
+        job = build_jobs.submit(grammar_text, mode)
+    except BuildQueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+    return jsonify(job.to_dict()), 202
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE'])
+def build_job(job_id):
+    """Estado de un trabajo; DELETE lo cancela"""
+    if request.method == 'DELETE':
+        job = build_jobs.cancel(job_id)
+    else:
+        job = build_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def build_job_events(job_id):
+    """Envía el estado del trabajo como NDJSON cada vez que cambia, hasta
+    que termina o pasan BUILD_EVENTS_TIMEOUT segundos: la conexión ocupa un
+    worker del servidor, así que tras ese tiempo se cierra y el cliente
+    vuelve a conectarse (o consulta /jobs/<id>) si el trabajo sigue en curso"""
+    job = build_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Trabajo no encontrado."}), 404
+    
+    def generate():
+        seen = -1
+        deadline = perf_counter() + BUILD_EVENTS_TIMEOUT
+        while True:
+            with job.changed:
+                # Sin cambios en 15 s se repite el último estado (keep-alive)
+                remaining = deadline - perf_counter()
+                job.changed.wait_for(lambda: job.version != seen, timeout=max(0, min(15, remaining)))
+                seen = job.version
+            record = job.to_dict()
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+            if record["status"] in BuildJob.FINISHED or perf_counter() >= deadline:
+                break
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def complexity_error_response(error):
+    """Respuesta estructurada cuando la construcción supera un límite"""
+    metrics.inc('lr1_builds_rejected_total', kind=error.kind, phase=error.phase)
+    return jsonify({
+        "error": str(error),
+        "complexity_exceeded": error.to_dict()
+    }), 422
+
+def budget_error_response(error):
+    """Respuesta estructurada cuando un análisis agota su presupuesto"""
+    return jsonify({
+        "error": str(error),
+        "accepted": False,
+        "budget_exceeded": error.to_dict(),
+        "parsing_steps": error.partial_steps
+    }), 422
+
+def glr_result(tables, input_string, token_patterns=None, trace='full',
+               max_steps=None, time_limit=None):
+    """Análisis GLR para las respuestas JSON: (aceptada, árbol, bosque,
+    ambigüedades); el árbol es una de las derivaciones del bosque"""
+    with metrics.timer('glr'):
+        accepted, _, forest = tables.glr_parse(input_string, token_patterns, max_steps, time_limit)
+    if not accepted:
+        return False, None, None, []
+    with metrics.timer('forest'):
+        tree = tables.original_tree(forest.tree()) if trace != 'none' else None
+        return True, tree, forest.to_dict(), forest.ambiguities()
+
+def parse_with_artifact(artifact_id, input_string, token_patterns=None, trace='full',
+                        max_steps=None, time_limit=None, glr=False):
+    """Analiza la cadena con tablas precompiladas, sin leer la gramática"""
+    try:
+        tables = load_artifact(artifact_id)
+        if glr:
+            accepted, parse_tree, forest, ambiguities = glr_result(
+                tables, input_string or '', token_patterns, trace, max_steps, time_limit)
+            return jsonify({
+                "accepted": accepted,
+                "artifact_id": artifact_id,
+                "mode": tables.mode,
+                "state_count": tables.n_states,
+                "parse_tree": parse_tree,
+                "parse_forest": forest,
+                "ambiguities": ambiguities
+            })
+        with metrics.timer('parse'):
+            accepted, parse_steps, parse_tree = tables.parse(input_string or '', token_patterns,
+                                                             trace, max_steps, time_limit)
+    except ParseBudgetExceeded as e:
+        return budget_error_response(e)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    
+    return jsonify({
+        "accepted": accepted,
+        "artifact_id": artifact_id,
+        "mode": tables.mode,
+        "state_count": tables.n_states,
+        "parsing_steps": parse_steps,
+        "parse_tree": parse_tree
+    })
+
+def check_token_patterns(token_patterns):
+    """Comprueba que token_patterns sea un objeto {tipo de token: expresión
+    regular} con expresiones válidas; lanza ValueError si no"""
+    if token_patterns is None:
+        return None
+    if not isinstance(token_patterns, dict) or not all(
+            isinstance(token_type, str) and isinstance(pattern, str)
+            for token_type, pattern in token_patterns.items()):
+        raise ValueError("token_patterns debe ser un objeto con cadenas como claves y valores.")
+    Lexer((), token_patterns)
+    return token_patterns
+
+def parse_budget(options):
+    """Límites de pasos y de tiempo pedidos; nunca mayores que los del
+    servidor. Lanza ValueError si max_steps no es un entero positivo o
+    time_limit no es un número positivo finito."""
+    max_steps = options.get('max_steps')
+    time_limit = options.get('time_limit')
+    if max_steps is None or max_steps == '':
+        max_steps = PARSE_MAX_STEPS
+    else:
+        try:
+            max_steps = int(str(max_steps))
+        except ValueError:
+            max_steps = 0
+        if max_steps < 1:
+            raise ValueError("max_steps debe ser un entero positivo.")
+        max_steps = min(max_steps, PARSE_MAX_STEPS)
+    if time_limit is None or time_limit == '':
+        time_limit = PARSE_TIME_LIMIT
+    else:
+        try:
+            time_limit = float(str(time_limit))
+        except ValueError:
+            time_limit = 0.0
+        if not 0 < time_limit < float('inf'):
+            raise ValueError("time_limit debe ser un número positivo.")
+        time_limit = min(time_limit, PARSE_TIME_LIMIT)
+    return max_steps, time_limit
+
+def batch_workers(options):
+    """Procesos pedidos para un lote; nunca más que los del servidor"""
+    workers = options.get('workers')
+    if workers is None or workers == '':
+        return BATCH_WORKERS
+    try:
+        workers = int(str(workers))
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        raise ValueError("workers debe ser un entero positivo.")
+    return min(workers, BATCH_WORKERS)
+
+def resolve_tables(options):
+    """Obtiene las tablas pedidas por 'artifact_id' o por 'grammar' y 'mode'.
+    Devuelve (tablas, None) o (None, respuesta de error)."""
+    if options.get('artifact_id'):
+        try:
+            return load_artifact(options['artifact_id']), None
+        except ValueError as e:
+            return None, (jsonify({"error": str(e)}), 400)
+        except FileNotFoundError as e:
+            return None, (jsonify({"error": str(e)}), 404)
+    
+    grammar_text = options.get('grammar')
+    mode = options.get('mode', 'lr1')
+    normalize = options.get('normalize', 'none')
+    if not grammar_text:
+        return None, (jsonify({"error": "La gramática no puede estar vacía."}), 400)
+    if mode not in PARSER_MODES:
+        return None, (jsonify({"error": f"Modo desconocido: {mode}. Use uno de: {', '.join(PARSER_MODES)}."}), 400)
+    if normalize not in NORMALIZE_LEVELS:
+        return None, (jsonify({"error": f"Nivel de normalización desconocido: {normalize}. Use uno de: {', '.join(NORMALIZE_LEVELS)}."}), 400)
+    try:
+        return get_parser(grammar_text, mode, normalize=normalize).tables, None
+    except GrammarTooComplex as e:
+        return None, complexity_error_response(e)
+
+@app.route('/parse/stream', methods=['POST'])
+def handle_stream_request():
+    """Envía la traza del análisis como NDJSON a medida que se genera:
+    un registro "start" con los tokens, un registro "step" por paso y un
+    registro "result" final"""
+    data = request.json
+    tables, error = resolve_tables(data)
+    if error:
+        return error
+    
+    input_string = data.get('input_string') or ''
+    include_tree = bool(data.get('include_tree', True))
+    try:
+        max_steps, time_limit = parse_budget(data)
+        token_patterns = check_token_patterns(data.get('token_patterns'))
+        tokens = [token.type for token in tables.tokenize(input_string, token_patterns)]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tokens.append('$')
+    
+    def generate():
+        yield json.dumps({"type": "start", "mode": tables.mode, "state_count": tables.n_states,
+                          "tokens": tokens}, ensure_ascii=False) + '\n'
+        for record in tables.iter_steps(tokens, build_tree=include_tree,
+                                        max_steps=max_steps, time_limit=time_limit):
+            record["type"] = "result" if "accepted" in record else "step"
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/parse/batch', methods=['POST'])
+def handle_batch_request():
+    try:
+        inputs, options = read_batch_inputs()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    include_tree = str(options.get('include_tree', '')).lower() in ('1', 'true')
+    try:
+        workers = batch_workers(options)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    token_patterns = options.get('token_patterns')
+    if isinstance(token_patterns, str):
+        try:
+            token_patterns = json.loads(token_patterns)
+        except ValueError as e:
+            return jsonify({"error": f"token_patterns no es JSON válido: {e}"}), 400
+    try:
+        check_token_patterns(token_patterns)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    tables, error = resolve_tables(options)
+    if error:
+        return error
+    
+    try:
+        max_steps, time_limit = parse_budget(options)
+        results = parse_batch(tables, inputs, include_tree, workers,
+                              token_patterns, max_steps, time_limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "count": len(results),
+        "accepted_count": sum(1 for r in results if r["accepted"]),
+        "results": results
+    })
+
 @app.route('/parse', methods=['POST'])
 def handle_parse_request():
     data = request.json
     grammar_text = data.get('grammar')
     input_string = data.get('input_string')
+    mode = data.get('mode', 'lr1')
+
+    token_patterns = data.get('token_patterns')
+    trace = data.get('trace', 'full')
+    normalize = data.get('normalize', 'none')
+    if data.get('timings'):
+        # Desglose de tiempos por fase en la respuesta y en Server-Timing
+        metrics.start_breakdown()
+
+    if trace not in TRACE_LEVELS:
+        return jsonify({"error": f"Nivel de traza desconocido: {trace}. Use uno de: {', '.join(TRACE_LEVELS)}."}), 400
+    if normalize not in NORMALIZE_LEVELS:
+        return jsonify({"error": f"Nivel de normalización desconocido: {normalize}. Use uno de: {', '.join(NORMALIZE_LEVELS)}."}), 400
+    fields = data.get('fields')
+    if fields is not None:
+        if not isinstance(fields, list) or not all(isinstance(name, str) for name in fields):
+            return jsonify({"error": "fields debe ser una lista de nombres de campo."}), 400
+        unknown = [name for name in fields if name not in PARSE_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Campos desconocidos: {', '.join(unknown)}. Use: {', '.join(PARSE_FIELDS)}."}), 400
+        fields = set(fields)
+    try:
+        max_steps, time_limit = parse_budget(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        check_token_patterns(token_patterns)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if data.get('artifact_id'):
+        return parse_with_artifact(data['artifact_id'], input_string, token_patterns,
+                                   trace, max_steps, time_limit, bool(data.get('glr')))
 
     if not grammar_text:
         return jsonify({"error": "La gramática no puede estar vacía."}), 400
+    if mode not in PARSER_MODES:
+        return jsonify({"error": f"Modo desconocido: {mode}. Use uno de: {', '.join(PARSER_MODES)}."}), 400
 
     try:
-        # Parsear la gramática
-        grammar = parse_grammar(grammar_text)
+        # Obtener el parser en el modo pedido (desde la caché si ya se construyó)
+        parser = get_parser(grammar_text, mode, data.get('base_grammar_id'), normalize=normalize)
+        grammar = parser.grammar
         
-        # Crear el parser LR(1)
-        parser = LR1Parser(grammar)
+        # Solo se calculan los campos pedidos; sin pasos ni árbol basta con reconocer
+        if fields is not None:
+            if 'parsing_steps' not in fields:
+                trace = 'tree' if 'parse_tree' in fields and trace != 'none' else 'none'
         
-        # Analizar la cadena
+        # Analizar la cadena (con GLR se siguen todas las acciones en conflicto)
+        glr = bool(data.get('glr'))
+        incremental = bool(data.get('incremental'))
+        if incremental and (glr or trace == 'full'):
+            return jsonify({"error": "El análisis incremental no registra pasos ni usa GLR: use trace 'tree' o 'none'."}), 400
         parse_tree = None
+        parse_forest = None
+        ambiguities = []
+        document = None
         if input_string:
-            accepted, parse_steps, parse_tree = parser.parse(input_string)
+            try:
+                if glr:
+                    accepted, parse_tree, parse_forest, ambiguities = glr_result(
+                        parser.tables, input_string, token_patterns, trace, max_steps, time_limit)
+                    parse_steps = []
+                elif incremental:
+                    # Reanálisis a partir de la versión anterior de la entrada, si sigue en memoria
+                    base = document_cache.get(data.get('base_input_id') or '')
+                    with metrics.timer('parse'):
+                        document = parser.tables.parse_incremental(input_string, token_patterns, base,
+                                                                   max_steps, time_limit)
+                    document_cache.put(document)
+                    accepted = document.accepted
+                    parse_steps = []
+                    if trace == 'tree':
+                        with metrics.timer('tree'):
+                            parse_tree = document.tree()
+                else:
+                    with metrics.timer('parse'):
+                        accepted, parse_steps, parse_tree = parser.parse(input_string, token_patterns, trace,
+                                                                         max_steps, time_limit)
+            except ParseBudgetExceeded as e:
+                return budget_error_response(e)
         else:
             accepted = True
             parse_steps = [{
@@ -702,64 +4513,113 @@ def handle_parse_request():
                 "action": "No hay cadena para analizar"
             }]
         
-        # Formatear los datos para el frontend
-        states_data = []
-        for i, state in enumerate(parser.states):
-            state_info = {
-                "id": i,
-                "items": [str(item) for item in state]
-            }
-            states_data.append(state_info)
-        
-        # Convertir goto_table para JSON (tuplas a strings)
-        goto_table_json = {}
-        for (state_id, symbol), target_state in parser.goto_table.items():
-            key = f"{state_id},{symbol}"
-            goto_table_json[key] = target_state
-          # Filtrar FIRST sets solo para no terminales
-        first_sets_nonterminals = {k: list(v) for k, v in parser.first_sets.items() 
-                                   if k in grammar.non_terminals}
-        
-        # Convertir action_table a formato JSON-serializable
-        serialized_action_table = {}
-        for state_id, actions in parser.action_table.items():
-            serialized_action_table[state_id] = {}
-            for symbol, action in actions.items():
-                # Convertir tuplas a listas para JSON
-                if isinstance(action, tuple):
-                    serialized_action_table[state_id][symbol] = list(action)
-                    # Si hay una lista anidada de acciones (conflictos), convertirla también
-                    if action[0] == 'conflict' and isinstance(action[1], list):
-                        serialized_action_table[state_id][symbol][1] = [
-                            list(a) if isinstance(a, tuple) else a 
-                            for a in action[1]
-                        ]
-                else:
-                    serialized_action_table[state_id][symbol] = action
-          # Analizar tipo de gramática
-        grammar_analysis = parser.analyze_grammar_type()
-        
-        return jsonify({
-            "accepted": accepted,
-            "augmented_grammar": parser.get_augmented_grammar(),
-            "first_sets": first_sets_nonterminals,
-            "first_table": parser.first_table,
-            "canonical_collection": states_data,
-            "parsing_table_action": serialized_action_table,
-            "parsing_table_goto": goto_table_json,
-            "parsing_steps": parse_steps,
-            "parse_tree": parse_tree,
-            "lr1_dot": parser.to_dot(),   # AFD
-            "grammar_analysis": grammar_analysis  # Análisis de la gramática
-        })
+        # Cada campo se genera solo si se pidió
+        builders = {
+            "accepted": lambda: accepted,
+            "mode": lambda: mode,
+            "trace": lambda: trace,
+            "grammar_id": lambda: parser.grammar_id,
+            "state_count": lambda: len(parser.states),
+            "augmented_grammar": parser.get_augmented_grammar,
+            # Filtrar FIRST sets solo para no terminales
+            "first_sets": lambda: {k: list(v) for k, v in parser.first_sets.items()
+                                   if k in grammar.non_terminals},
+            "first_table": lambda: parser.first_table,
+            "canonical_collection": parser.serialize_states,
+            "parsing_table_action": parser.serialize_action_table,
+            "parsing_table_goto": parser.serialize_goto_table,
+            "parsing_steps": lambda: parse_steps,
+            "parse_tree": lambda: parse_tree,
+            "lr1_dot": parser.to_dot,   # AFD
+            "grammar_analysis": parser.analyze_grammar_type,  # Análisis de la gramática
+            "size_estimate": lambda: parser.size_estimate,
+            "table_compression": lambda: parser.tables.compression,
+            "normalization": lambda: grammar.normalization,
+        }
+        if glr:
+            builders["parse_forest"] = lambda: parse_forest
+            builders["ambiguities"] = lambda: ambiguities
+        if incremental:
+            # input_id es la base del siguiente reanálisis
+            builders["input_id"] = lambda: document.input_id if document else None
+            builders["reparse"] = lambda: document.stats if document else None
+        if data.get('compare_modes'):
+            # Estados y conflictos por modo, para elegir el más barato sin conflictos
+            builders["mode_comparison"] = lambda: compare_modes(grammar_text)
+        
+        response = {}
+        for name, build in builders.items():
+            if fields is None or name in fields:
+                with metrics.timer(f"field.{name}"):
+                    response[name] = build()
+        timings = metrics.breakdown()
+        if timings is not None:
+            response["timings"] = timings
+        with metrics.timer('serialize'):
+            return jsonify(response)
 
+    except GrammarTooComplex as e:
+        return complexity_error_response(e)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         import traceback
         print("Error details:", traceback.format_exc())  # Para debug
         return jsonify({"error": f"Error al procesar la gramática: {str(e)}"}), 500
     
-# --- Iniciar el servidor ---
+# --- Línea de comandos ---
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Generador de parsers LR(1)")
+    commands = cli.add_subparsers(dest='command')
+    
+    commands.add_parser('serve', help="Inicia el servidor web (por defecto)")
+    
+    export_cmd = commands.add_parser('export', help="Compila una gramática a un artefacto binario")
+    export_cmd.add_argument('grammar_file')
+    export_cmd.add_argument('--mode', choices=list(PARSER_MODES), default='lr1')
+    export_cmd.add_argument('--normalize', choices=list(NORMALIZE_LEVELS), default='none')
+    export_cmd.add_argument('-o', '--output', help="Ruta de salida (por defecto ARTIFACT_DIR/<id>.lr1t)")
+    
+    inspect_cmd = commands.add_parser('inspect', help="Muestra el contenido de un artefacto")
+    inspect_cmd.add_argument('artifact')
+    
+    codegen_cmd = commands.add_parser('codegen', help="Genera un módulo Python independiente con el parser")
+    codegen_cmd.add_argument('grammar_file')
+    codegen_cmd.add_argument('--mode', choices=list(PARSER_MODES), default='lr1')
+    codegen_cmd.add_argument('--normalize', choices=list(NORMALIZE_LEVELS), default='none')
+    codegen_cmd.add_argument('-o', '--output', help="Ruta del módulo (por defecto, salida estándar)")
+    
+    args = cli.parse_args(argv)
+    
+    if args.command == 'export':
+        with open(args.grammar_file, encoding='utf-8') as f:
+            artifact_id, path = export_artifact(f.read(), args.mode, args.output, limits=None,
+                                             normalize=args.normalize)
+        print(f"{artifact_id} {path}")
+    elif args.command == 'codegen':
+        with open(args.grammar_file, encoding='utf-8') as f:
+            source = generate_parser_module(get_parser(f.read(), args.mode, limits=None,
+                                                       normalize=args.normalize).tables)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(source)
+        else:
+            sys.stdout.write(source)
+    elif args.command == 'inspect':
+        tables = CompiledTables.load(args.artifact)
+        print(f"modo: {tables.mode}")
+        print(f"estados: {tables.n_states}")
+        print(f"terminales: {' '.join(tables.terminals)}")
+        print(f"no terminales: {' '.join(tables.non_terminals)}")
+        print(f"producciones: {len(tables.productions)}")
+        print(f"tablas: {tables.table_bytes()} bytes")
+        if tables.compression:
+            print(f"compactadas desde: {tables.compression['dense_bytes']} bytes")
+    else:
+        # --- Iniciar el servidor ---
+        port = int(os.environ.get('PORT', 5000))
+        app.run(host='0.0.0.0', port=port, debug=False)
+
 if __name__ == '__main__':
-    import os
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    main()
@@ -0,0 +1,293 @@
+"""Benchmarks de construcción y de análisis del generador LR(1).
+
+Uso:
+    python benchmarks/bench.py run [--quick] [--max-tokens N] [-o resultados.json]
+    python benchmarks/bench.py compare antes.json despues.json [--threshold 0.1]
+
+'run' construye cada gramática del corpus en todos los modos y analiza
+entradas de 10 a 10^6 tokens. El resultado es un JSON con metadatos (commit,
+versión de Python, plataforma) y una lista de registros, cada uno con una
+clave estable ("build/lang/lr1", "parse/expr/1000/tree", ...), para que
+'compare' pueda cruzar dos ejecuciones hechas en commits distintos.
+Las entradas se generan con semillas fijas y cada medida es el mínimo de
+varias repeticiones."""
+import os
+import sys
+import gc
+import json
+import pickle
+import random
+import argparse
+import platform
+import subprocess
+from time import perf_counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import app  # noqa: E402
+
+SIZES = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+TREE_MAX_TOKENS = 100_000       # el árbol completo ocupa memoria proporcional
+FULL_TRACE_MAX_TOKENS = 10_000  # la traza completa guarda la entrada restante en cada paso
+SEED = 1234
+
+# --- Corpus ---
+
+def read_grammar(name):
+    with open(os.path.join(BENCH_DIR, 'grammars', f'{name}.txt'), encoding='utf-8') as f:
+        return f.read()
+
+def stress_grammar(levels):
+    """Lista de sentencias con `levels` niveles de precedencia de operadores"""
+    lines = ["S -> S E0 ; | E0 ;"]
+    for i in range(levels):
+        lines.append(f"E{i} -> E{i} op{i} E{i + 1} | E{i + 1}")
+    lines.append(f"E{levels} -> ( E0 ) | id | num")
+    return '\n'.join(lines)
+
+def expression(rng, tokens, ops, atoms, budget, depth=0):
+    """Añade a tokens una expresión de unos `budget` tokens"""
+    start = len(tokens)
+    while True:
+        if depth < 3 and budget > 8 and rng.random() < 0.15:
+            tokens.append('(')
+            expression(rng, tokens, ops, atoms, rng.randint(3, 8), depth + 1)
+            tokens.append(')')
+        else:
+            tokens.append(rng.choice(atoms))
+        if len(tokens) - start >= budget:
+            return
+        tokens.append(rng.choice(ops))
+
+def expr_tokens(rng, n):
+    tokens = []
+    expression(rng, tokens, ('+', '*'), ('id',), max(n, 1))
+    return tokens
+
+def lang_tokens(rng, n):
+    ops = ('+', '-', '*', '/')
+    atoms = ('id', 'num')
+    tokens = []
+    depth = 0
+    while len(tokens) < n or depth:
+        kind = rng.random()
+        if depth and (kind < 0.15 or len(tokens) >= n):
+            tokens.append('}')
+            depth -= 1
+        elif kind < 0.45:
+            tokens += ['var', 'id', '=']
+            expression(rng, tokens, ops, atoms, rng.randint(1, 9))
+            tokens.append(';')
+        elif kind < 0.6:
+            tokens += ['print', '(']
+            expression(rng, tokens, ops, atoms, rng.randint(1, 5))
+            tokens += [')', ';']
+        elif depth < 8:
+            tokens += [rng.choice(('if', 'while')), '(']
+            expression(rng, tokens, ops, atoms, rng.randint(1, 3))
+            tokens.append(rng.choice(('<', '>', '==', '!=')))
+            expression(rng, tokens, ops, atoms, rng.randint(1, 3))
+            tokens += [')', '{']
+            depth += 1
+        else:
+            tokens += ['id', '=', 'num', ';']
+    return tokens
+
+def stress_tokens(levels):
+    def generate(rng, n):
+        ops = tuple(f'op{i}' for i in range(levels))
+        tokens = []
+        while len(tokens) < n:
+            expression(rng, tokens, ops, ('id', 'num'), rng.randint(1, 40))
+            tokens.append(';')
+        return tokens
+    return generate
+
+CORPUS = {
+    'expr': (lambda: read_grammar('expr'), expr_tokens),
+    'lang': (lambda: read_grammar('lang'), lang_tokens),
+    'stress-10': (lambda: stress_grammar(10), stress_tokens(10)),
+    'stress-30': (lambda: stress_grammar(30), stress_tokens(30)),
+}
+
+# --- Medidas ---
+
+def best_of(function, repeat):
+    """Mínimo de `repeat` ejecuciones (segundos) y el último resultado"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        result = function()
+        best = min(best, perf_counter() - start)
+    return best, result
+
+def bench_build(name, grammar_text, mode, repeat):
+    seconds, parser = best_of(lambda: app.LR1Parser(app.parse_grammar(grammar_text), mode=mode), repeat)
+    records = [{
+        "key": f"build/{name}/{mode}",
+        "benchmark": "build", "grammar": name, "mode": mode,
+        "seconds": seconds,
+        "states": len(parser.kernels),
+        "productions": len(parser.grammar.productions),
+        "conflicts": len(parser.analyze_grammar_type()["conflicts"]),
+        "table_bytes": parser.tables.table_bytes(),
+        "dense_table_bytes": (parser.tables.compression or {}).get("dense_bytes"),
+        "pickled_bytes": len(pickle.dumps(parser, protocol=pickle.HIGHEST_PROTOCOL)),
+    }]
+
+    # closure y goto por separado sobre los estados ya construidos
+    def closures():
+        parser._closure_cache = {}
+        parser._item_pool = {}
+        return sum(len(parser.closure_of(kernel)) for kernel in parser.kernels)
+    seconds, items = best_of(closures, repeat)
+    records.append({"key": f"closure/{name}/{mode}", "benchmark": "closure", "grammar": name,
+                    "mode": mode, "seconds": seconds, "items": items})
+
+    states = [parser.closure_of(kernel) for kernel in parser.kernels]
+    def gotos():
+        return sum(len(kernel) for state in states
+                   for kernel in parser.successor_kernels(state).values())
+    seconds, items = best_of(gotos, repeat)
+    records.append({"key": f"goto/{name}/{mode}", "benchmark": "goto", "grammar": name,
+                    "mode": mode, "seconds": seconds, "transitions": len(parser.goto_table), "items": items})
+    return records
+
+def bench_parse(name, tables, size, tokens, repeat):
+    """Análisis de una entrada de unos `size` tokens (la clave usa `size`;
+    el número real de tokens va en "tokens")"""
+    text = ' '.join(tokens)
+    n = len(tokens)
+    budget = {"max_steps": 20 * n + 100, "time_limit": 3600.0}
+    runs = [('lex', lambda: (True, list(tables.tokenize(text))))]
+    runs.append(('none', lambda: tables.parse(text, trace='none', **budget)))
+    if size <= TREE_MAX_TOKENS:
+        runs.append(('tree', lambda: tables.parse(text, trace='tree', **budget)))
+        runs.append(('glr', lambda: tables.glr_parse(text, **budget)))
+        # Reanálisis incremental tras insertar un espacio a mitad de la entrada
+        middle = text.find(' ', len(text) // 2) + 1
+        edited = text[:middle] + ' ' + text[middle:]
+        base = tables.parse_incremental(text, **budget)
+        def reparse():
+            document = tables.parse_incremental(edited, base=base, **budget)
+            return document.accepted, document
+        runs.append(('incremental', reparse))
+    if size <= FULL_TRACE_MAX_TOKENS:
+        runs.append(('full', lambda: tables.parse(text, trace='full', **budget)))
+
+    records = []
+    for level, run in runs:
+        seconds, result = best_of(run, repeat)
+        records.append({
+            "key": f"parse/{name}/{size}/{level}",
+            "benchmark": "parse", "grammar": name, "size": size, "tokens": n, "trace": level,
+            "accepted": bool(result[0]),
+            "seconds": seconds,
+            "tokens_per_second": n / seconds if seconds else None,
+        })
+    return records
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    sizes = [n for n in SIZES if n <= args.max_tokens]
+    results = []
+    for name, (grammar, generate) in CORPUS.items():
+        if args.grammar and name not in args.grammar:
+            continue
+        grammar_text = grammar()
+        for mode in app.PARSER_MODES:
+            print(f"build {name} {mode}", file=sys.stderr)
+            results += bench_build(name, grammar_text, mode, 1 if args.quick else 3)
+
+        tables = app.LR1Parser(app.parse_grammar(grammar_text), mode='lr1').tables
+        list(tables.tokenize(''))     # compilar el lexer fuera de las medidas
+        for size in sizes:
+            tokens = generate(random.Random(SEED), size)
+            print(f"parse {name} {len(tokens)} tokens", file=sys.stderr)
+            repeat = 1 if args.quick or size >= 100_000 else 5
+            results += bench_parse(name, tables, size, tokens, repeat)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+# --- Comparación ---
+
+def metric(record):
+    """Medida principal (mayor es peor): segundos por token o segundos"""
+    if record["benchmark"] == "parse":
+        return record["seconds"] / max(record["tokens"], 1)
+    return record["seconds"]
+
+def compare(args):
+    with open(args.before, encoding='utf-8') as f:
+        before = {r["key"]: r for r in json.load(f)["results"]}
+    with open(args.after, encoding='utf-8') as f:
+        after = {r["key"]: r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"{'benchmark':<36} {'antes':>12} {'después':>12} {'cambio':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        old, new = metric(before[key]), metric(after[key])
+        change = new / old - 1 if old else 0.0
+        flag = ''
+        if change > args.threshold:
+            flag = '  REGRESIÓN'
+            regressions += 1
+        elif change < -args.threshold:
+            flag = '  mejora'
+        print(f"{key:<36} {old:>12.3g} {new:>12.3g} {change:>+8.1%}{flag}")
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"{key:<36} solo en {'antes' if key in before else 'después'}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(description="Benchmarks del generador LR(1)")
+    commands = cli.add_subparsers(dest='command', required=True)
+
+    run_cmd = commands.add_parser('run', help="Ejecuta los benchmarks")
+    run_cmd.add_argument('-o', '--output', help="Archivo JSON de salida (por defecto, salida estándar)")
+    run_cmd.add_argument('--quick', action='store_true', help="Una sola repetición por medida")
+    run_cmd.add_argument('--max-tokens', type=int, default=SIZES[-1],
+                         help="Tamaño máximo de entrada (por defecto 10^6)")
+    run_cmd.add_argument('--grammar', action='append', choices=list(CORPUS),
+                         help="Solo esta gramática (se puede repetir)")
+
+    compare_cmd = commands.add_parser('compare', help="Compara dos ejecuciones")
+    compare_cmd.add_argument('before')
+    compare_cmd.add_argument('after')
+    compare_cmd.add_argument('--threshold', type=float, default=0.1,
+                             help="Cambio relativo a partir del cual se marca (por defecto 0.1)")
+    compare_cmd.add_argument('--fail-on-regression', action='store_true',
+                             help="Termina con código 1 si hay regresiones")
+
+    args = cli.parse_args(argv)
+    if args.command == 'compare':
+        return compare(args)
+    run(args)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,7 @@
+// grammar_id de la última gramática construida: el servidor la usa como base
+// para reconstruir de forma incremental tras una edición
+let lastGrammarId = null;
+
 document.getElementById('parseBtn').addEventListener('click', async () => {
   const grammar = document.getElementById('grammar').value.trim();
   const inputString = document.getElementById('inputString').value.trim();
@@ -21,11 +25,15 @@ document.getElementById('parseBtn').addEventListener('click', async () => {
       },
       body: JSON.stringify({
         grammar: grammar,
-        input_string: inputString
+        input_string: inputString,
+        base_grammar_id: lastGrammarId
       })
     });
 
     const data = await response.json();
+    if (response.ok && data.grammar_id) {
+      lastGrammarId = data.grammar_id;
+    }
 
     if (response.ok) {
       displayResults(data);
@@ -139,7 +147,7 @@ function displayGrammarAnalysis(analysis) {
   } else if (analysis.is_lr1) {
     const noConflicts = document.createElement('div');
     noConflicts.className = 'no-conflicts';
-    noConflicts.innerHTML = '🎉 La gramática es LR(1) - Sin conflictos';
+    noConflicts.innerHTML = `🎉 La gramática es ${analysis.grammar_type} - Sin conflictos`;
     analysisDiv.appendChild(noConflicts);
   }
 
@@ -681,11 +689,15 @@ document.getElementById('analyzeBtn').addEventListener('click', async () => {
       },
       body: JSON.stringify({
         grammar: grammar,
-        input_string: inputString
+        input_string: inputString,
+        base_grammar_id: lastGrammarId
       })
     });
 
     const data = await response.json();
+    if (response.ok && data.grammar_id) {
+      lastGrammarId = data.grammar_id;
+    }
 
     if (response.ok) {
       // Mostrar solo el resultado del análisis
@@ -0,0 +1,35 @@
+"""Gramáticas aleatorias pequeñas para las pruebas"""
+
+NON_TERMINALS = ['S', 'A', 'B', 'C', 'D']
+TERMINALS = ['a', 'b', 'c', 'd', '+', '(', ')']
+
+
+def random_production(rng, non_terminals, terminals):
+    symbols = [rng.choice(non_terminals + terminals) for _ in range(rng.randint(0, 4))]
+    return ' '.join(symbols) or 'ε'
+
+
+def random_grammar(rng):
+    """(líneas de la gramática, no terminales, terminales)"""
+    non_terminals = NON_TERMINALS[:rng.randint(1, 5)]
+    terminals = TERMINALS[:rng.randint(2, 7)]
+    lines = [f"{nt} -> {random_production(rng, non_terminals, terminals)}"
+             for nt in non_terminals for _ in range(rng.randint(1, 3))]
+    return lines, non_terminals, terminals
+
+
+def random_edit(rng, lines, non_terminals, terminals):
+    """Borra, añade o alarga una producción (la primera línea fija el inicio)"""
+    lines = list(lines)
+    choice = rng.random()
+    if choice < 0.4 and len(lines) > 1:
+        del lines[rng.randrange(1, len(lines))]
+    elif choice < 0.8:
+        lhs = rng.choice(non_terminals + ['E'])
+        lines.insert(rng.randrange(1, len(lines) + 1),
+                     f"{lhs} -> {random_production(rng, non_terminals, terminals)}")
+    else:
+        i = rng.randrange(len(lines))
+        if not lines[i].endswith('ε'):
+            lines[i] += ' ' + rng.choice(non_terminals + terminals)
+    return lines
@@ -0,0 +1,83 @@
+"""Las tablas compactadas (CompiledTables.compress) deben cubrir las densas y
+analizar igual toda entrada: misma aceptación, árbol, posición del error y
+traza completa."""
+import os
+import random
+import sys
+
+import pytest
+
+import app
+from random_grammars import random_grammar
+
+sys.path.insert(0, os.path.join(app.BASE_DIR, 'benchmarks'))
+import bench  # noqa: E402
+
+
+def tables_pair(grammar_text, mode):
+    """(tablas densas, tablas compactadas) del mismo parser"""
+    parser = app.LR1Parser(app.parse_grammar(grammar_text), mode=mode)
+    dense = app.CompiledTables(parser)
+    packed = app.CompiledTables(parser)
+    packed.compress()
+    return dense, packed
+
+
+def assert_same_analysis(dense, packed, text):
+    budget = {"max_steps": 20_000}
+    try:
+        expected = dense.parse(text, trace='full', **budget)
+    except app.ParseBudgetExceeded:
+        return
+    assert packed.parse(text, trace='full', **budget) == expected, text
+    assert packed.parse(text, trace='tree', **budget) == dense.parse(text, trace='tree', **budget), text
+    tokens = [token.type for token in dense.tokenize(text)] + ['$']
+    assert packed.recognize(tokens, **budget)[:2] == dense.recognize(tokens, **budget)[:2], text
+    if dense.conflicts:
+        accepted, position, forest = dense.glr_parse(text, **budget)
+        packed_accepted, packed_position, packed_forest = packed.glr_parse(text, **budget)
+        assert (packed_accepted, packed_position) == (accepted, position), text
+        if accepted:
+            assert packed_forest.to_dict() == forest.to_dict(), text
+
+
+def mutate(rng, tokens, vocabulary):
+    """La entrada con un token borrado, cambiado o insertado"""
+    tokens = list(tokens)
+    position = rng.randrange(len(tokens) + 1)
+    choice = rng.random()
+    if choice < 0.3 and position < len(tokens):
+        del tokens[position]
+    elif choice < 0.6 and position < len(tokens):
+        tokens[position] = rng.choice(vocabulary)
+    else:
+        tokens.insert(position, rng.choice(vocabulary))
+    return tokens
+
+
+@pytest.mark.parametrize('mode', list(app.PARSER_MODES))
+@pytest.mark.parametrize('name', list(bench.CORPUS))
+def test_corpus_compression(name, mode):
+    grammar, generate = bench.CORPUS[name]
+    dense, packed = tables_pair(grammar(), mode)
+    assert packed.compression["bytes"] < packed.compression["dense_bytes"]
+    assert packed.covers(dense)
+    rng = random.Random(1234)
+    vocabulary = dense.terminals + ['?']
+    for _ in range(10):
+        tokens = generate(rng, rng.randint(1, 60))
+        assert_same_analysis(dense, packed, ' '.join(tokens))
+        assert_same_analysis(dense, packed, ' '.join(mutate(rng, tokens, vocabulary)))
+
+
+@pytest.mark.parametrize('mode', list(app.PARSER_MODES))
+@pytest.mark.parametrize('seed', range(4))
+def test_random_grammar_compression(mode, seed):
+    rng = random.Random(seed)
+    for _ in range(40):
+        lines, _, terminals = random_grammar(rng)
+        dense, packed = tables_pair('\n'.join(lines), mode)
+        assert packed.covers(dense), lines
+        for _ in range(8):
+            text = ' '.join(rng.choice(terminals + ['zz']) for _ in range(rng.randint(0, 8)))
+            assert_same_analysis(dense, packed, text)
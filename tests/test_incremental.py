@@ -0,0 +1,41 @@
+"""La reconstrucción incremental (LR1Parser con base=) debe dar las mismas
+tablas que una construcción completa de la gramática editada."""
+import os
+import random
+
+import pytest
+
+import app
+from random_grammars import random_edit, random_grammar
+
+
+@pytest.mark.parametrize('mode', list(app.PARSER_MODES))
+@pytest.mark.parametrize('seed', range(4))
+def test_incremental_matches_full_rebuild(mode, seed):
+    rng = random.Random(seed)
+    for _ in range(40):
+        lines, non_terminals, terminals = random_grammar(rng)
+        parser = app.LR1Parser(app.parse_grammar('\n'.join(lines)), mode=mode)
+        for _ in range(4):
+            lines = random_edit(rng, lines, non_terminals, terminals)
+            text = '\n'.join(lines)
+            full = app.LR1Parser(app.parse_grammar(text), mode=mode)
+            incremental = app.LR1Parser(app.parse_grammar(text), mode=mode, base=parser)
+            assert incremental.action_table == full.action_table, text
+            assert incremental.goto_table == full.goto_table, text
+            assert incremental.tables.same_as(full.tables), text
+            parser = incremental
+
+
+@pytest.mark.parametrize('mode', ['lr1', 'slr1'])
+def test_incremental_reuses_unchanged_states(mode):
+    with open(os.path.join(app.BASE_DIR, 'benchmarks', 'grammars', 'lang.txt'),
+              encoding='utf-8') as f:
+        text = f.read()
+    base = app.LR1Parser(app.parse_grammar(text), mode=mode)
+    edited = text + "\nStmt -> return Expr ;"
+    full = app.LR1Parser(app.parse_grammar(edited), mode=mode)
+    incremental = app.LR1Parser(app.parse_grammar(edited), mode=mode, base=base)
+    assert incremental.incremental
+    assert incremental.action_table == full.action_table
+    assert incremental.closure_calls < full.closure_calls / 2